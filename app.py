@@ -1,15 +1,31 @@
-from flask import Flask, render_template, jsonify, request, send_file
+from flask import Flask, Response, render_template, jsonify, request, send_file, make_response
+from werkzeug.http import is_resource_modified
+from datetime import datetime, timezone
+import gzip
+import hashlib
 import threading
+import time
 import os
 import optimizer
 
+try:
+    import brotli
+except ImportError:
+    brotli = None # Optional, gzip is used when it isn't installed
+
 app = Flask(__name__)
 
+# Responses smaller than this aren't worth compressing
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_MIMETYPES = ("application/json", "text/html")
+
 # Global state
 class State:
     status = "Idle"
     logs = []
     results = None
+    run_id = 0 # Incremented per run so clients can tell a fresh log from a continued one
+    lock = threading.Lock() # Keeps logs and run_id consistent for /api/status
 
 state = State()
 
@@ -18,20 +34,86 @@ def log_callback(msg):
 
 optimizer.set_log_callback(log_callback)
 
-def run_benchmark_thread():
+def run_benchmark_thread(full=False, parallel=False):
     state.status = "Running"
-    state.logs = []
+    with state.lock:
+        state.logs = []
+        state.run_id += 1
     state.results = None
     
     try:
         url = os.environ.get('JELLYFIN_URL')
         api_key = os.environ.get('JELLYFIN_API_KEY')
-        optimizer.run_optimization_process(url, api_key)
+        optimizer.run_optimization_process(url, api_key, full, parallel)
         state.status = "Complete"
     except Exception as e:
         state.status = "Error"
         state.logs.append(f"Error: {str(e)}")
 
+def run_library_scan_thread(full=False):
+    url = os.environ.get('JELLYFIN_URL')
+    api_key = os.environ.get('JELLYFIN_API_KEY')
+    optimizer.scan_library(url, api_key, full)
+
+def validator_last_modified(validator):
+    mtimes = [mtime for _, mtime, _ in validator if mtime is not None]
+    if not mtimes:
+        return None
+    return datetime.fromtimestamp(max(mtimes) / 1e9, tz=timezone.utc)
+
+def conditional_response(build, validator=None, last_modified=None):
+    """
+    Serves build() with a weak ETag and answers 304 if the client already has it.
+    With a validator (a cheap value that changes whenever the payload would) the
+    check happens before build() runs; otherwise the ETag is a hash of the body.
+    """
+    etag = None
+    if validator is not None:
+        etag = hashlib.sha1(repr(validator).encode()).hexdigest()
+        if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+            response = Response(status=304)
+            response.set_etag(etag, weak=True)
+            response.cache_control.no_cache = True
+            return response
+
+    response = make_response(build())
+    if response.status_code != 200:
+        return response
+
+    if etag is None:
+        etag = hashlib.sha1(response.get_data()).hexdigest()
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    # Let browsers keep the body but revalidate on every poll
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.after_request
+def compress_response(response):
+    if (response.status_code != 200 or response.direct_passthrough
+            or response.mimetype not in COMPRESS_MIMETYPES
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    accept = request.accept_encodings
+    if brotli and accept['br']:
+        data = brotli.compress(data, quality=4)
+        response.headers['Content-Encoding'] = 'br'
+    elif accept['gzip']:
+        data = gzip.compress(data, compresslevel=5)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+
+    response.set_data(data)
+    return response
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -41,7 +123,8 @@ def start_benchmark():
     if state.status == "Running":
         return jsonify({"error": "Benchmark already running"}), 400
     
-    thread = threading.Thread(target=run_benchmark_thread)
+    data = request.get_json(silent=True) or {}
+    thread = threading.Thread(target=run_benchmark_thread, args=(bool(data.get('full')), bool(data.get('parallel'))))
     thread.start()
     return jsonify({"message": "Benchmark started"})
 
@@ -66,10 +149,44 @@ def stop_benchmark():
     optimizer.stop_benchmark()
     return jsonify({"message": "Benchmark stop requested"})
 
+@app.route('/api/library', methods=['GET'])
+def get_library():
+    validator = optimizer.get_library_validator()
+    last_modified = validator_last_modified(validator)
+    if optimizer.is_library_scanning():
+        validator.append(("scanning", None, None))
+        last_modified = None
+    return conditional_response(lambda: jsonify(optimizer.get_library_summary()), validator, last_modified)
+
+@app.route('/api/library/scan', methods=['POST'])
+def scan_library():
+    if optimizer.is_library_scanning():
+        return jsonify({"error": "Library scan already running"}), 400
+
+    data = request.get_json(silent=True) or {}
+    thread = threading.Thread(target=run_library_scan_thread, args=(bool(data.get('full')),))
+    thread.start()
+    return jsonify({"message": "Library scan started"})
+
+@app.route('/api/telemetry', methods=['GET'])
+def get_telemetry():
+    days = request.args.get('days', default=7, type=int)
+    # Benchmark predictions come from the newest run, so results count too
+    validator = optimizer.get_telemetry_validator() + optimizer.get_results_validator()
+    validator.append(("days", None, days))
+    # "Transcoding now" and the days window age with the clock, not only with new samples;
+    # no Last-Modified either, since file times alone can't tell whether that changed
+    validator.append(("interval", None, int(time.time() // max(optimizer.TELEMETRY_INTERVAL, 1))))
+    return conditional_response(lambda: jsonify(optimizer.get_telemetry_summary(days)), validator)
+
 @app.route('/api/backups', methods=['GET'])
 def list_backups():
-    backups = optimizer.list_backups()
-    return jsonify(backups)
+    validator = optimizer.get_backups_validator()
+    return conditional_response(
+        lambda: jsonify(optimizer.list_backups()),
+        validator,
+        validator_last_modified(validator)
+    )
 
 @app.route('/api/backup', methods=['POST'])
 def create_backup():
@@ -113,13 +230,23 @@ def apply_settings():
 
 @app.route('/api/recommendations', methods=['GET'])
 def get_recommendations():
-    recommendations = optimizer.analyze_results()
-    if recommendations:
-        if "error" in recommendations:
-             return jsonify(recommendations), 404
-        return jsonify(recommendations)
-    else:
-        return jsonify({"error": "No recommendations available"}), 404
+    def build():
+        recommendations = optimizer.analyze_results()
+        if recommendations:
+            if "error" in recommendations:
+                 return jsonify(recommendations), 404
+            return jsonify(recommendations)
+        else:
+            return jsonify({"error": "No recommendations available"}), 404
+
+    # Recommendations follow from the latest run and the library profile
+    validator = optimizer.get_results_validator() + optimizer.get_library_validator()
+    last_modified = validator_last_modified(validator)
+    if state.status == "Running":
+        # The running run's files change without touching their directories
+        validator.append(("run", state.run_id, len(state.logs)))
+        last_modified = None
+    return conditional_response(build, validator, last_modified)
 
 @app.route('/api/backup/delete', methods=['POST'])
 def delete_backup():
@@ -136,7 +263,7 @@ def delete_backup():
 
 @app.route('/api/backup/download/<filename>', methods=['GET'])
 def download_backup(filename):
-    backup_dir = "/app/jellybench_data/backups"
+    backup_dir = os.path.join(optimizer.DATA_DIR, "backups")
     filepath = os.path.join(backup_dir, filename)
     if os.path.exists(filepath):
         from flask import send_file
@@ -162,22 +289,44 @@ def get_config():
     
     config = optimizer.get_jellyfin_config(url, api_key)
     if config:
-        return jsonify(config)
+        # The config has to be fetched either way; the ETag saves resending it
+        return conditional_response(lambda: jsonify(config))
     else:
         return jsonify({"error": "Failed to fetch configuration"}), 500
 
 @app.route('/api/results', methods=['GET'])
 def list_results():
-    results = optimizer.list_results()
-    return jsonify(results)
+    validator = optimizer.get_results_validator()
+    last_modified = validator_last_modified(validator)
+    if state.status == "Running":
+        # The running console log changes without touching its directory
+        validator.append(("run", state.run_id, len(state.logs)))
+        last_modified = None
+    return conditional_response(lambda: jsonify(optimizer.list_results()), validator, last_modified)
 
 @app.route('/api/results/<path:filename>', methods=['GET'])
 def get_result(filename):
-    content = optimizer.get_result_content(filename)
-    if content is not None:
-        return jsonify({"filename": filename, "content": content})
-    else:
-        return jsonify({"error": "File not found"}), 404
+    def build():
+        content = optimizer.get_result_content(filename)
+        if content is not None:
+            return jsonify({"filename": filename, "content": content})
+        else:
+            return jsonify({"error": "File not found"}), 404
+
+    validator = optimizer.get_result_validator(filename)
+    return conditional_response(build, validator, validator_last_modified(validator))
+
+@app.route('/api/results/trace/<path:filename>', methods=['GET'])
+def get_result_trace(filename):
+    def build():
+        spans = optimizer.get_result_trace(filename)
+        if spans is not None:
+            return jsonify({"filename": filename, "spans": spans})
+        else:
+            return jsonify({"error": "No trace recorded for this run"}), 404
+
+    validator = optimizer.get_trace_validator(filename)
+    return conditional_response(build, validator, validator_last_modified(validator))
 
 @app.route('/api/results/download/<path:filename>', methods=['GET'])
 def download_result(filename):
@@ -206,11 +355,24 @@ def delete_result(filename):
 
 @app.route('/api/status')
 def get_status():
-    return jsonify({
+    # Clients pass ?since=<log_count> to receive only lines they haven't seen yet
+    since = request.args.get('since', default=0, type=int)
+    with state.lock:
+        logs = state.logs
+        run_id = state.run_id
+    since = max(0, min(since, len(logs)))
+    new_logs = logs[since:]
+    payload = {
         "status": state.status,
-        "logs": state.logs,
+        "run_id": run_id,
+        "log_offset": since,
+        "log_count": since + len(new_logs),
+        "logs": new_logs,
         "results": state.results
-    })
+    }
+    validator = (payload["status"], payload["run_id"], since, payload["log_count"], repr(payload["results"]))
+    return conditional_response(lambda: jsonify(payload), validator)
 
 if __name__ == '__main__':
+    optimizer.start_telemetry(os.environ.get('JELLYFIN_URL'), os.environ.get('JELLYFIN_API_KEY'))
     app.run(host='0.0.0.0', port=5000)
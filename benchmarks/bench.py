@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for Jellyfin Auto-Tune's own hot paths.
+
+Runs entirely locally: no GPU, no network and no Jellyfin server required.
+The jellybench CLI is replaced by fake_jellybench.py and all result data is
+synthesised in a temporary directory.
+
+Usage:
+    python benchmarks/bench.py                  # run and compare against baseline.json
+    python benchmarks/bench.py --save-baseline  # run and store results as the new baseline
+    python benchmarks/bench.py --only status --only pty_reader
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+import optimizer
+
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+
+@contextlib.contextmanager
+def quiet():
+    # optimizer.log() prints every line; keep that cost but not the noise
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+    }
+
+
+def make_log_line(i, width=100):
+    line = f"[Auto-Tune] {i:08d} | test=h264_1080p_cpu frame={i * 24} fps=87.3 speed=2.91x "
+    return line + "." * max(0, width - len(line))
+
+
+def make_data_dir(root, runs, console_logs, large_log_mb, json_mb):
+    """
+    Builds a synthetic jellybench_data directory with `runs` native result
+    directories, `console_logs` console logs and one large latest run that
+    carries multi-megabyte logs and an output.json.
+    """
+    base = datetime(2024, 1, 1)
+    for i in range(runs):
+        name = "results_run-" + (base + timedelta(minutes=i)).strftime("%Y-%m-%d_%H-%M-%S")
+        log_dir = os.path.join(root, name, "log")
+        os.makedirs(log_dir)
+        with open(os.path.join(log_dir, "summary.log"), 'w') as f:
+            f.write(make_log_line(i) + "\n")
+
+    results_dir = os.path.join(root, "results")
+    os.makedirs(results_dir)
+    for i in range(console_logs):
+        path = os.path.join(results_dir, f"run_{i:06d}.log")
+        with open(path, 'w') as f:
+            f.write(make_log_line(i) + "\n")
+        # Console logs are dated by mtime; keep them older than the native runs
+        mtime = (base - timedelta(minutes=console_logs - i)).timestamp()
+        os.utime(path, (mtime, mtime))
+
+    latest = "results_run-" + (base + timedelta(minutes=runs)).strftime("%Y-%m-%d_%H-%M-%S")
+    log_dir = os.path.join(root, latest, "log")
+    os.makedirs(log_dir)
+    line_count = int(large_log_mb * 1024 * 1024 / 101)
+    for part in range(4):
+        with open(os.path.join(log_dir, f"{part:02d}_ffmpeg.log"), 'w') as f:
+            for i in range(line_count // 4):
+                f.write(make_log_line(i) + "\n")
+
+    entries = []
+    entry_bytes = 200
+    for i in range(int(json_mb * 1024 * 1024 / entry_bytes)):
+        entries.append({
+            "test": f"h264_1080p_{i}",
+            "codec": "h264",
+            "worker": i % 16,
+            "speed": 2.91,
+            "fps": 87.3,
+            "failure_reason": None,
+        })
+    entries.append({"test": "hevc_2160p_nvenc", "codec": "hevc", "hwaccel": "NVENC"})
+    with open(os.path.join(root, latest, "output.json"), 'w') as f:
+        json.dump({"tests": entries}, f)
+
+    return latest
+
+
+def install_fake_jellybench(ctx):
+    bin_dir = os.path.join(ctx["tmp"], "bin")
+    os.makedirs(bin_dir, exist_ok=True)
+    wrapper = os.path.join(bin_dir, "jellybench")
+    with open(wrapper, 'w') as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.join(BENCH_DIR, "fake_jellybench.py")}" "$@"\n')
+    os.chmod(wrapper, 0o755)
+    return bin_dir
+
+
+def bench_pty_reader(args, ctx):
+    bin_dir = install_fake_jellybench(ctx)
+
+    env_backup = dict(os.environ)
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+    os.environ["FAKE_JELLYBENCH_LINE_BYTES"] = str(args.pty_line_bytes)
+
+    results = {}
+    lines_seen = []
+    optimizer.set_log_callback(lines_seen.append)
+    try:
+        for rate in args.pty_rates:
+            os.environ["FAKE_JELLYBENCH_RATE"] = str(rate)
+            # Rate-limited runs are bounded to ~2s so the suite stays quick
+            lines = args.pty_lines if rate == 0 else min(args.pty_lines, int(rate * 2))
+            os.environ["FAKE_JELLYBENCH_LINES"] = str(lines)
+
+            walls, cpus = [], []
+            for _ in range(args.repeat):
+                lines_seen.clear()
+                cpu_start = time.process_time()
+                wall_start = time.perf_counter()
+                with quiet():
+                    optimizer.run_benchmark()
+                walls.append(time.perf_counter() - wall_start)
+                cpus.append(time.process_time() - cpu_start)
+
+            wall = statistics.median(walls)
+            label = "unbounded" if rate == 0 else f"{int(rate)}_lps"
+            results[label] = {
+                "lines": lines,
+                "lines_seen": len(lines_seen),
+                "median_s": wall,
+                "cpu_s": statistics.median(cpus),
+                "lines_per_s": lines / wall if wall else 0,
+            }
+    finally:
+        optimizer.set_log_callback(None)
+        os.environ.clear()
+        os.environ.update(env_backup)
+    return results
+
+
+def bench_watchdog(args, ctx):
+    # A "progress:" line looks like a prompt to the reader; the output after it
+    # must put the stall timers back in force, or this hang is never caught
+    bin_dir = install_fake_jellybench(ctx)
+
+    env_backup = dict(os.environ)
+    limits = (optimizer.STALL_TIMEOUT, optimizer.KILL_GRACE)
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+    os.environ["FAKE_JELLYBENCH_LINES"] = "10"
+    os.environ["FAKE_JELLYBENCH_RATE"] = "0"
+    os.environ["FAKE_JELLYBENCH_HANG"] = str(args.watchdog_hang)
+    optimizer.STALL_TIMEOUT = args.watchdog_stall_timeout
+    optimizer.KILL_GRACE = 1
+    try:
+        def run():
+            with quiet():
+                optimizer.run_benchmark()
+            if not optimizer._last_stalls:
+                raise RuntimeError("watchdog missed a stall after a prompt-like line")
+
+        timing = measure(run, args.repeat)
+    finally:
+        optimizer.STALL_TIMEOUT, optimizer.KILL_GRACE = limits
+        os.environ.clear()
+        os.environ.update(env_backup)
+    return {"stall_after_prompt_like_line": timing}
+
+
+def bench_status(args, ctx):
+    import app as web
+
+    client = web.app.test_client()
+    results = {}
+    for size in args.status_sizes:
+        web.state.logs = [make_log_line(i) for i in range(size)]
+        payload = {}
+
+        def request():
+            r = client.get('/api/status')
+            payload["bytes"] = len(r.data)
+
+        timing = measure(request, args.repeat * 5)
+        results[f"{size}_lines"] = dict(timing, payload_bytes=payload["bytes"])
+
+        # Incremental poll as done by the dashboard: only the last few lines are new
+        def tail_request():
+            r = client.get(f'/api/status?since={size - 10}')
+            payload["bytes"] = len(r.data)
+
+        timing = measure(tail_request, args.repeat * 5)
+        results[f"{size}_lines_tail"] = dict(timing, payload_bytes=payload["bytes"])
+    web.state.logs = []
+    return results
+
+
+def bench_list_results(args, ctx):
+    optimizer.DATA_DIR = ctx["data_dir"]
+    count = {}
+
+    def run():
+        count["items"] = len(optimizer.list_results())
+
+    timing = measure(run, args.repeat)
+    return {"list_results": dict(timing, items=count["items"])}
+
+
+def bench_get_result_content(args, ctx):
+    optimizer.DATA_DIR = ctx["data_dir"]
+    results = {}
+    cases = {
+        "small_run": "results_run-2024-01-01_00-00-00",
+        "large_run": ctx["latest"],
+        "console_log": "results/run_000000.log",
+    }
+    for label, identifier in cases.items():
+        size = {}
+
+        def run():
+            size["content_bytes"] = len(optimizer.get_result_content(identifier) or "")
+
+        timing = measure(run, args.repeat)
+        results[label] = dict(timing, content_bytes=size["content_bytes"])
+    return results
+
+
+def bench_create_result_zip(args, ctx):
+    optimizer.DATA_DIR = ctx["data_dir"]
+    identifier = ctx["latest"]
+
+    timing = measure(lambda: optimizer.create_result_zip(identifier), args.repeat)
+
+    tracemalloc.start()
+    buffer = optimizer.create_result_zip(identifier)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"large_run": dict(timing, peak_bytes=peak, zip_bytes=buffer.getbuffer().nbytes)}
+
+
+def bench_json_analysis(args, ctx):
+    optimizer.DATA_DIR = ctx["data_dir"]
+    outcome = {}
+
+    def run():
+        with quiet():
+            outcome["recommendations"] = optimizer.analyze_results()
+
+    timing = measure(run, args.repeat)
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    if "error" in outcome["recommendations"]:
+        raise RuntimeError(f"analysis did not use output.json: {outcome['recommendations']}")
+    return {"analyze_results": dict(timing, peak_bytes=peak)}
+
+
+BENCHMARKS = {
+    "pty_reader": bench_pty_reader,
+    "watchdog": bench_watchdog,
+    "status": bench_status,
+    "list_results": bench_list_results,
+    "get_result_content": bench_get_result_content,
+    "create_result_zip": bench_create_result_zip,
+    "json_analysis": bench_json_analysis,
+}
+
+NEEDS_DATA_DIR = {"list_results", "get_result_content", "create_result_zip", "json_analysis"}
+
+
+# Arguments that don't change what is measured; all others must match the baseline's
+NON_WORKLOAD_ARGS = {"only", "repeat", "baseline", "save_baseline", "tolerance"}
+
+
+def workload_args(args):
+    return {k: v for k, v in vars(args).items() if k not in NON_WORKLOAD_ARGS}
+
+
+def workload_differences(args, meta):
+    saved = meta.get("args", {})
+    return {k: (saved.get(k), v) for k, v in workload_args(args).items() if saved.get(k) != v}
+
+
+def metric_direction(name):
+    # -1: lower is better, 1: higher is better, 0: informational
+    if name.endswith("_per_s"):
+        return 1
+    if name.endswith("_s") or name.endswith("_bytes"):
+        return -1
+    return 0
+
+
+def compare(current, baseline, tolerance):
+    regressions = []
+    for bench, cases in current.items():
+        for case, metrics in cases.items():
+            base_metrics = baseline.get(bench, {}).get(case)
+            if not base_metrics:
+                continue
+            for metric, value in metrics.items():
+                direction = metric_direction(metric)
+                base = base_metrics.get(metric)
+                if direction == 0 or not base:
+                    continue
+                ratio = value / base
+                worse = ratio > 1 + tolerance if direction < 0 else ratio < 1 - tolerance
+                marker = "REGRESSION" if worse else ""
+                print(f"  {bench}/{case}/{metric}: {base:.6g} -> {value:.6g} ({ratio:.2f}x) {marker}")
+                if worse:
+                    regressions.append(f"{bench}/{case}/{metric}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Jellyfin Auto-Tune hot paths")
+    parser.add_argument('--only', action='append', choices=sorted(BENCHMARKS), help="Run only this benchmark (repeatable)")
+    parser.add_argument('--repeat', type=int, default=3, help="Repetitions per measurement")
+    parser.add_argument('--runs', type=int, default=10000, help="Synthetic native runs in the data dir")
+    parser.add_argument('--console-logs', type=int, default=500, help="Synthetic console logs in results/")
+    parser.add_argument('--large-log-mb', type=float, default=8, help="Log size of the latest run")
+    parser.add_argument('--json-mb', type=float, default=4, help="Size of the latest run's output.json")
+    parser.add_argument('--pty-lines', type=int, default=20000, help="Lines emitted by the fake jellybench")
+    parser.add_argument('--pty-line-bytes', type=int, default=120, help="Length of each fake jellybench line")
+    parser.add_argument('--pty-rates', type=float, nargs='+', default=[0, 2000], help="Fake output rates in lines/s (0 = unbounded)")
+    parser.add_argument('--watchdog-stall-timeout', type=float, default=1, help="Stall timeout for the watchdog check")
+    parser.add_argument('--watchdog-hang', type=float, default=30, help="Seconds the fake jellybench hangs in the watchdog check")
+    parser.add_argument('--status-sizes', type=int, nargs='+', default=[1000, 10000, 100000], help="Log lengths for /api/status")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="Baseline file")
+    parser.add_argument('--save-baseline', action='store_true', help="Store this run as the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed relative slowdown before flagging a regression")
+    args = parser.parse_args()
+
+    selected = args.only or list(BENCHMARKS)
+    tmp = tempfile.mkdtemp(prefix="jelly-bench-")
+    ctx = {"tmp": tmp}
+    original_data_dir = optimizer.DATA_DIR
+    results = {}
+
+    try:
+        optimizer.DATA_DIR = os.path.join(tmp, "pty_data")
+        if NEEDS_DATA_DIR.intersection(selected):
+            data_dir = os.path.join(tmp, "data")
+            os.makedirs(data_dir)
+            print(f"Generating synthetic data dir with {args.runs} runs...", flush=True)
+            ctx["latest"] = make_data_dir(data_dir, args.runs, args.console_logs, args.large_log_mb, args.json_mb)
+            ctx["data_dir"] = data_dir
+
+        for name in selected:
+            print(f"Running {name}...", flush=True)
+            results[name] = BENCHMARKS[name](args, ctx)
+            for case, metrics in results[name].items():
+                summary = ", ".join(f"{k}={v:.6g}" if isinstance(v, float) else f"{k}={v}" for k, v in metrics.items())
+                print(f"  {case}: {summary}")
+    finally:
+        optimizer.DATA_DIR = original_data_dir
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if args.save_baseline:
+        baseline = {"results": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r') as f:
+                baseline = json.load(f)
+        if workload_differences(args, baseline.get("meta", {})):
+            # Results measured with other arguments can't share a baseline with these
+            baseline["results"] = {}
+        baseline["meta"] = {
+            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": workload_args(args),
+        }
+        baseline["results"].update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=4)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found. Run with --save-baseline to create one.")
+        return 0
+
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    differences = workload_differences(args, baseline.get("meta", {}))
+    if differences:
+        print("Not comparing: the baseline was measured with different arguments:")
+        for name, (saved, current) in sorted(differences.items()):
+            print(f"  --{name.replace('_', '-')}: baseline {saved}, now {current}")
+        print("Re-run with the baseline's arguments, or with --save-baseline to replace it.")
+        return 1
+
+    print(f"Comparing against baseline from {baseline.get('meta', {}).get('date', 'unknown')}:")
+    regressions = compare(results, baseline.get("results", {}), args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
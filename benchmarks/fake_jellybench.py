@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the jellybench CLI used by the benchmark suite.
+Emits synthetic progress lines at a configurable rate so the pty reader in
+optimizer.run_benchmark can be measured without a GPU or network access.
+
+Configured through environment variables:
+    FAKE_JELLYBENCH_LINES       number of lines to emit (default 10000)
+    FAKE_JELLYBENCH_LINE_BYTES  approximate length of each line (default 120)
+    FAKE_JELLYBENCH_RATE        lines per second, 0 = as fast as possible (default 0)
+    FAKE_JELLYBENCH_HANG        seconds to hang silently before finishing, after
+                                a "progress:" line that looks like a prompt (default 0)
+"""
+import os
+import sys
+import time
+
+
+def main():
+    lines = int(os.environ.get('FAKE_JELLYBENCH_LINES', 10000))
+    line_bytes = int(os.environ.get('FAKE_JELLYBENCH_LINE_BYTES', 120))
+    rate = float(os.environ.get('FAKE_JELLYBENCH_RATE', 0))
+    hang = float(os.environ.get('FAKE_JELLYBENCH_HANG', 0))
+
+    interval = 1.0 / rate if rate > 0 else 0
+    start = time.monotonic()
+
+    for i in range(lines):
+        prefix = f"[fake] test {i // 100:04d} | frame={i:08d} fps=123.45 speed=4.12x "
+        line = prefix + "#" * max(0, line_bytes - len(prefix))
+        sys.stdout.write(line + "\n")
+        if interval:
+            sys.stdout.flush()
+            # Sleep against an absolute schedule so the rate doesn't drift
+            delay = start + (i + 1) * interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    if hang:
+        # Ends in ':' like a prompt, but the rest of the line follows
+        sys.stdout.write("progress:")
+        sys.stdout.flush()
+        time.sleep(0.2)
+        sys.stdout.write(" 10%\n")
+        sys.stdout.flush()
+        time.sleep(hang)
+
+    sys.stdout.write("Benchmark finished.\n")
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
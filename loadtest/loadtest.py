@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test for the Auto-Tune web app.
+
+Starts a stub Jellyfin server and the real app.py against a temporary data
+directory, then simulates N dashboard clients. Each client polls
+/api/status every poll interval and refreshes /api/config, /api/results,
+/api/backups and /api/telemetry every refresh interval, like a dashboard left open on a wall
+screen. Reports per-route p50/p95/p99 latency, throughput and server RSS.
+
+Usage:
+    python loadtest/loadtest.py --clients 50 --duration 60
+    python loadtest/loadtest.py --clients 20 --jellyfin-latency 200 --jellyfin-failure-rate 0.1
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+
+LOADTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(LOADTEST_DIR)
+sys.path.insert(0, LOADTEST_DIR)
+
+import stub_jellyfin
+
+POLL_ROUTES = ["/api/status"]
+REFRESH_ROUTES = ["/api/config", "/api/results", "/api/backups", "/api/telemetry"]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def seed_data_dir(data_dir, runs, backups):
+    base = datetime(2024, 1, 1)
+    for i in range(runs):
+        name = "results_run-" + (base + timedelta(minutes=i)).strftime("%Y-%m-%d_%H-%M-%S")
+        log_dir = os.path.join(data_dir, name, "log")
+        os.makedirs(log_dir)
+        with open(os.path.join(log_dir, "summary.log"), 'w') as f:
+            f.write(f"run {i}: h264 1080p nvenc fps=240.0\n")
+
+    backup_dir = os.path.join(data_dir, "backups")
+    os.makedirs(backup_dir, exist_ok=True)
+    for i in range(backups):
+        timestamp = (base + timedelta(minutes=i)).strftime("%Y%m%d_%H%M%S")
+        with open(os.path.join(backup_dir, f"jelly-tune-{timestamp}.json"), 'w') as f:
+            json.dump(stub_jellyfin.DEFAULT_ENCODING_CONFIG, f, indent=4)
+
+
+def start_app(port, data_dir, jellyfin_url, api_key, telemetry_interval):
+    env = dict(os.environ)
+    env["JELLYFIN_URL"] = jellyfin_url
+    env["JELLYFIN_API_KEY"] = api_key
+    env["JELLYBENCH_DATA_DIR"] = data_dir
+    env["JELLYFIN_TELEMETRY_INTERVAL"] = str(telemetry_interval)
+    # Same startup as app.py's __main__ block, which importing app skips: the
+    # session collector has to run for /api/telemetry to see writes under load
+    code = (
+        "import os, app; "
+        "app.optimizer.start_telemetry(os.environ['JELLYFIN_URL'], os.environ['JELLYFIN_API_KEY']); "
+        f"app.app.run(host='127.0.0.1', port={port}, threaded=True)"
+    )
+    return subprocess.Popen(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_until_ready(base_url, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(base_url + "/api/status", timeout=1)
+            return True
+        except requests.RequestException:
+            time.sleep(0.1)
+    return False
+
+
+def read_rss(pid):
+    # Linux only; returns bytes or None
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def record(self, route, latency, ok):
+        with self.lock:
+            self.samples.setdefault(route, []).append(latency)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+
+def client_loop(base_url, recorder, deadline, poll_interval, refresh_interval, timeout, conditional):
+    session = requests.Session()
+    etags = {}
+    # Stagger clients the way independently opened tabs would be
+    time.sleep(random.uniform(0, poll_interval))
+    next_poll = time.monotonic()
+    next_refresh = next_poll
+
+    while time.monotonic() < deadline:
+        routes = list(POLL_ROUTES)
+        if time.monotonic() >= next_refresh:
+            routes += REFRESH_ROUTES
+            next_refresh += refresh_interval
+
+        for route in routes:
+            start = time.perf_counter()
+            headers = {}
+            if conditional and route in etags:
+                # Revalidate like a browser holding a cached copy
+                headers["If-None-Match"] = etags[route]
+            try:
+                r = session.get(base_url + route, headers=headers, timeout=timeout)
+                r.content
+                if "ETag" in r.headers:
+                    etags[route] = r.headers["ETag"]
+                # /api/config and /api/recommendations answer 5xx/404 when Jellyfin fails;
+                # that is the app behaving correctly, only transport errors and 5xx count
+                ok = r.status_code < 500
+            except requests.RequestException:
+                ok = False
+            recorder.record(route, time.perf_counter() - start, ok)
+
+        next_poll += poll_interval
+        delay = next_poll - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def rss_sampler(pid, samples, stop, interval=0.5):
+    while not stop.is_set():
+        rss = read_rss(pid)
+        if rss is not None:
+            samples.append(rss)
+        stop.wait(interval)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, int(round(pct / 100 * len(sorted_values))) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def build_report(recorder, elapsed, rss_samples, args):
+    routes = {}
+    total = 0
+    for route, latencies in sorted(recorder.samples.items()):
+        latencies = sorted(latencies)
+        total += len(latencies)
+        routes[route] = {
+            "requests": len(latencies),
+            "errors": recorder.errors.get(route, 0),
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "max_ms": latencies[-1] * 1000,
+            "throughput_rps": len(latencies) / elapsed,
+        }
+    return {
+        "config": {
+            "clients": args.clients,
+            "duration_s": elapsed,
+            "poll_interval_s": args.poll_interval,
+            "refresh_interval_s": args.refresh_interval,
+            "jellyfin_latency_ms": args.jellyfin_latency,
+            "jellyfin_failure_rate": args.jellyfin_failure_rate,
+            "jellyfin_sessions": args.jellyfin_sessions,
+            "telemetry_interval_s": args.telemetry_interval,
+            "conditional": not args.no_conditional,
+            "runs": args.runs,
+            "backups": args.backups,
+        },
+        "routes": routes,
+        "total_requests": total,
+        "total_throughput_rps": total / elapsed,
+        "server_rss_bytes": {
+            "start": rss_samples[0] if rss_samples else None,
+            "peak": max(rss_samples) if rss_samples else None,
+            "end": rss_samples[-1] if rss_samples else None,
+        },
+    }
+
+
+def print_report(report):
+    print(f"\n{'Route':<16} {'Reqs':>7} {'Errs':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'req/s':>8}")
+    for route, r in report["routes"].items():
+        print(f"{route:<16} {r['requests']:>7} {r['errors']:>6} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+              f"{r['p99_ms']:>9.1f} {r['max_ms']:>9.1f} {r['throughput_rps']:>8.1f}")
+    print(f"\nTotal: {report['total_requests']} requests, {report['total_throughput_rps']:.1f} req/s")
+    rss = report["server_rss_bytes"]
+    if rss["peak"]:
+        mb = 1024 * 1024
+        print(f"Server RSS: start {rss['start'] / mb:.1f} MB, peak {rss['peak'] / mb:.1f} MB, end {rss['end'] / mb:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Auto-Tune dashboard API")
+    parser.add_argument('--clients', type=int, default=20, help="Concurrent dashboard clients")
+    parser.add_argument('--duration', type=float, default=30, help="Test duration in seconds")
+    parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between /api/status polls per client")
+    parser.add_argument('--refresh-interval', type=float, default=1.0, help="Seconds between config/results/backups/telemetry refreshes per client")
+    parser.add_argument('--timeout', type=float, default=30, help="Per-request timeout in seconds")
+    parser.add_argument('--runs', type=int, default=200, help="Synthetic benchmark runs in the data dir")
+    parser.add_argument('--backups', type=int, default=50, help="Synthetic backups in the data dir")
+    parser.add_argument('--jellyfin-latency', type=float, default=20, help="Stub Jellyfin base latency in ms")
+    parser.add_argument('--jellyfin-jitter', type=float, default=10, help="Stub Jellyfin random extra latency in ms")
+    parser.add_argument('--jellyfin-failure-rate', type=float, default=0, help="Fraction of stub Jellyfin requests that fail")
+    parser.add_argument('--jellyfin-sessions', type=int, default=4, help="Transcoding sessions the stub Jellyfin reports")
+    parser.add_argument('--telemetry-interval', type=float, default=1.0, help="Seconds between the app's session telemetry polls")
+    parser.add_argument('--no-conditional', action='store_true', help="Don't send If-None-Match revalidation headers")
+    parser.add_argument('--app-url', default=None, help="Test an already running app instead of starting one")
+    parser.add_argument('--output', default=None, help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="jelly-loadtest-")
+    api_key = "loadtest"
+    stub = stub_jellyfin.make_server(
+        port=0,
+        api_key=api_key,
+        latency=args.jellyfin_latency / 1000,
+        jitter=args.jellyfin_jitter / 1000,
+        failure_rate=args.jellyfin_failure_rate,
+        sessions=args.jellyfin_sessions,
+    )
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    jellyfin_url = f"http://127.0.0.1:{stub.server_address[1]}"
+
+    app_process = None
+    try:
+        if args.app_url:
+            base_url = args.app_url.rstrip("/")
+        else:
+            data_dir = os.path.join(tmp, "data")
+            os.makedirs(data_dir)
+            seed_data_dir(data_dir, args.runs, args.backups)
+            port = free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            app_process = start_app(port, data_dir, jellyfin_url, api_key, args.telemetry_interval)
+
+        if not wait_until_ready(base_url):
+            print(f"App at {base_url} did not become ready.")
+            return 1
+
+        print(f"Stub Jellyfin at {jellyfin_url}, app at {base_url}")
+        print(f"Running {args.clients} clients for {args.duration:.0f}s...", flush=True)
+
+        recorder = Recorder()
+        rss_samples = []
+        stop = threading.Event()
+        if app_process:
+            threading.Thread(target=rss_sampler, args=(app_process.pid, rss_samples, stop), daemon=True).start()
+
+        start = time.monotonic()
+        deadline = start + args.duration
+        clients = [
+            threading.Thread(
+                target=client_loop,
+                args=(base_url, recorder, deadline, args.poll_interval, args.refresh_interval, args.timeout,
+                      not args.no_conditional),
+                daemon=True,
+            )
+            for _ in range(args.clients)
+        ]
+        for c in clients:
+            c.start()
+        for c in clients:
+            c.join()
+        elapsed = time.monotonic() - start
+        stop.set()
+
+        report = build_report(recorder, elapsed, rss_samples, args)
+        report["config"]["stub_requests"] = stub.stub.requests
+        report["config"]["stub_failures"] = stub.stub.failures
+        print_report(report)
+
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=4)
+            print(f"Report written to {args.output}")
+        return 0
+    finally:
+        if app_process:
+            app_process.terminate()
+            try:
+                app_process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                app_process.kill()
+        stub.shutdown()
+        stub.server_close()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
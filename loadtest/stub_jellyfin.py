@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Minimal stand-in for a Jellyfin server, used by the load-test harness.
+
+Implements just the endpoints Auto-Tune talks to, with configurable latency
+and failure injection:
+    GET  /System/Info
+    GET  /System/Configuration/encoding
+    POST /System/Configuration/encoding
+    GET  /Items (paged synthetic library, StartIndex/Limit/MinDateLastSaved)
+    GET  /Sessions (synthetic playback sessions that transcode)
+
+Usage:
+    python loadtest/stub_jellyfin.py --port 8096 --latency 50 --failure-rate 0.05
+    python loadtest/stub_jellyfin.py --port 8096 --items 120000 --sessions 4
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_ENCODING_CONFIG = {
+    "EncodingThreadCount": -1,
+    "TranscodingTempPath": "/config/transcodes",
+    "HardwareAccelerationType": "none",
+    "VaapiDevice": "/dev/dri/renderD128",
+    "QsvDevice": "",
+    "EnableHardwareEncoding": True,
+    "EnableTonemapping": False,
+    "EnableDecodingColorDepth10Hevc": True,
+    "EnableDecodingColorDepth10Vp9": True,
+    "AllowHevcEncoding": False,
+    "AllowAv1Encoding": False,
+    "HardwareDecodingCodecs": ["h264", "vc1"],
+}
+
+SYSTEM_INFO = {
+    "ServerName": "stub-jellyfin",
+    "Version": "10.9.11",
+    "Id": "00000000000000000000000000000000",
+    "OperatingSystem": "Linux",
+}
+
+
+# (codec, width, height, bit depth, video range type, weight) of synthetic library items
+LIBRARY_MIX = [
+    ("h264", 1920, 1080, 8, "SDR", 45),
+    ("h264", 1280, 720, 8, "SDR", 15),
+    ("hevc", 3840, 2160, 10, "HDR10", 15),
+    ("hevc", 1920, 1080, 10, "SDR", 10),
+    ("hevc", 3840, 2160, 10, "DOVI", 5),
+    ("av1", 1920, 1080, 10, "SDR", 5),
+    ("mpeg2video", 720, 576, 8, "SDR", 3),
+    ("vc1", 1920, 1080, 8, "SDR", 2),
+]
+
+LIBRARY_EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+def make_item(index, saved_at):
+    """Synthetic movie/episode; the same index always yields the same item."""
+    rng = random.Random(index)
+    codec, width, height, bit_depth, range_type, _ = rng.choices(LIBRARY_MIX, weights=[m[5] for m in LIBRARY_MIX])[0]
+    return {
+        "Id": f"{index:032x}",
+        "Name": f"Item {index}",
+        "Type": rng.choice(["Movie", "Episode"]),
+        "DateCreated": (LIBRARY_EPOCH + timedelta(minutes=index)).isoformat(),
+        "DateLastSaved": saved_at.isoformat(),
+        "RunTimeTicks": rng.randint(20, 150) * 60 * 10_000_000,
+        "MediaStreams": [
+            {
+                "Type": "Video",
+                "Codec": codec,
+                "Width": width,
+                "Height": height,
+                "BitDepth": bit_depth,
+                "VideoRange": "SDR" if range_type == "SDR" else "HDR",
+                "VideoRangeType": range_type,
+            },
+            {"Type": "Audio", "Codec": rng.choice(["aac", "ac3", "eac3", "truehd"])},
+        ],
+    }
+
+
+def make_session(index, started):
+    """Synthetic session transcoding library item index; 4K sources transcode slower than real time."""
+    item = make_item(index, LIBRARY_EPOCH)
+    source = item["MediaStreams"][0]
+    source["RealFrameRate"] = 23.976
+    base_fps = 18 if source["Height"] >= 2160 else 90
+    elapsed = time.time() - started
+    runtime = item["RunTimeTicks"] / 10_000_000
+    return {
+        "Id": f"{random.Random(-index - 1).getrandbits(128):032x}",
+        "UserName": f"user{index}",
+        "Client": "Jellyfin Web",
+        "NowPlayingItem": item,
+        "PlayState": {"IsPaused": False, "PlayMethod": "Transcode"},
+        "TranscodingInfo": {
+            "VideoCodec": "h264",
+            "AudioCodec": "aac",
+            "Container": "ts",
+            "IsVideoDirect": False,
+            "IsAudioDirect": False,
+            "Width": 1920,
+            "Height": 1080,
+            "Framerate": round(base_fps * random.uniform(0.8, 1.2), 1),
+            "CompletionPercentage": min(100.0, elapsed / runtime * 100),
+            "HardwareAccelerationType": "nvenc",
+            "TranscodeReasons": ["VideoCodecNotSupported"],
+        },
+    }
+
+
+class StubState:
+    def __init__(self, api_key=None, latency=0.0, jitter=0.0, failure_rate=0.0, library_size=0, sessions=0):
+        self.api_key = api_key
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.encoding_config = dict(DEFAULT_ENCODING_CONFIG)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        # (first item index, DateLastSaved) of each batch of items added to the library
+        self.library_size = 0
+        self.library_batches = []
+        self.add_items(library_size)
+        self.sessions = sessions
+        self.started = time.time()
+
+    def add_items(self, count):
+        """Adds items to the synthetic library, saved now (picked up by incremental scans)."""
+        with self.lock:
+            if count > 0:
+                self.library_batches.append((self.library_size, datetime.now(timezone.utc)))
+                self.library_size += count
+
+    def list_items(self, start_index, limit, min_date_last_saved=None):
+        with self.lock:
+            batches = list(self.library_batches)
+            size = self.library_size
+        # Items are ordered by DateCreated, so newer batches are always at the end
+        first = 0
+        if min_date_last_saved:
+            first = size
+            for batch_start, saved_at in batches:
+                if saved_at >= min_date_last_saved:
+                    first = batch_start
+                    break
+        total = size - first
+        indexes = range(first + start_index, min(size, first + start_index + limit))
+
+        def saved_at(index):
+            return next(saved for batch_start, saved in reversed(batches) if index >= batch_start)
+
+        items = [make_item(i, saved_at(i)) for i in indexes]
+        return {"Items": items, "TotalRecordCount": total, "StartIndex": start_index}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass # Stay quiet under load
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _prepare(self):
+        """Applies latency, auth and failure injection. Returns False if the request was already answered."""
+        stub = self.server.stub
+        with stub.lock:
+            stub.requests += 1
+
+        delay = stub.latency + random.uniform(0, stub.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        if stub.api_key and self.headers.get("X-Emby-Token") != stub.api_key:
+            self._send_json(401, {"error": "Unauthorized"})
+            return False
+
+        if stub.failure_rate and random.random() < stub.failure_rate:
+            with stub.lock:
+                stub.failures += 1
+            self._send_json(500, {"error": "Injected failure"})
+            return False
+
+        return True
+
+    def do_GET(self):
+        if not self._prepare():
+            return
+        parsed = urlparse(self.path)
+        path = parsed.path
+        if path == "/System/Info":
+            self._send_json(200, SYSTEM_INFO)
+        elif path == "/Items":
+            query = {k.lower(): v[0] for k, v in parse_qs(parsed.query).items()}
+            try:
+                start_index = int(query.get("startindex", 0))
+                limit = int(query.get("limit", 100))
+                min_saved = query.get("mindatelastsaved")
+                min_saved = datetime.fromisoformat(min_saved.replace("Z", "+00:00")) if min_saved else None
+            except ValueError:
+                self._send_json(400, {"error": "Invalid query"})
+                return
+            self._send_json(200, self.server.stub.list_items(start_index, limit, min_saved))
+        elif path == "/Sessions":
+            stub = self.server.stub
+            self._send_json(200, [make_session(i, stub.started) for i in range(stub.sessions)])
+        elif path == "/System/Configuration/encoding":
+            with self.server.stub.lock:
+                config = dict(self.server.stub.encoding_config)
+            self._send_json(200, config)
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        if not self._prepare():
+            return
+        path = self.path.split("?", 1)[0]
+        if path == "/System/Configuration/encoding":
+            try:
+                config = json.loads(body or b"{}")
+            except ValueError:
+                self._send_json(400, {"error": "Invalid JSON"})
+                return
+            with self.server.stub.lock:
+                self.server.stub.encoding_config.update(config)
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+
+def make_server(host="127.0.0.1", port=0, api_key=None, latency=0.0, jitter=0.0, failure_rate=0.0, library_size=0,
+                sessions=0):
+    """Creates (but does not start) a stub server. Latency and jitter are in seconds."""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.stub = StubState(api_key, latency, jitter, failure_rate, library_size, sessions)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Jellyfin server for load testing")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8096)
+    parser.add_argument('--api-key', default=None, help="Require this X-Emby-Token (default: accept any)")
+    parser.add_argument('--latency', type=float, default=0, help="Base response latency in ms")
+    parser.add_argument('--jitter', type=float, default=0, help="Additional random latency in ms")
+    parser.add_argument('--failure-rate', type=float, default=0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument('--items', type=int, default=1000, help="Size of the synthetic library served by /Items")
+    parser.add_argument('--sessions', type=int, default=2, help="Transcoding sessions reported by /Sessions")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.api_key, args.latency / 1000, args.jitter / 1000, args.failure_rate,
+                         args.items, args.sessions)
+    print(f"Stub Jellyfin listening on http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
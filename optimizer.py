@@ -7,7 +7,16 @@ import time
 
 import shutil
 import glob
-from datetime import datetime
+import re
+import signal
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+# Root of all persisted data (ffmpeg, backups, results). Overridable so the
+# tool can be exercised outside the container.
+DATA_DIR = os.environ.get('JELLYBENCH_DATA_DIR', "/app/jellybench_data")
 
 # Global logger callback
 _log_callback = None
@@ -22,7 +31,7 @@ def log(msg):
         _log_callback(msg)
 
 def setup_ffmpeg():
-    target_dir = "/app/jellybench_data/ffmpeg"
+    target_dir = os.path.join(DATA_DIR, "ffmpeg")
     cache_file = "/usr/local/share/jellybench_cache/jellyfin-ffmpeg_7.0.2-3_portable_linux64-gpl.tar.xz"
     target_file = os.path.join(target_dir, os.path.basename(cache_file))
     
@@ -69,7 +78,7 @@ def backup_settings(url, api_key, custom_name=None):
     if not config:
         return False
     
-    backup_dir = "/app/jellybench_data/backups"
+    backup_dir = os.path.join(DATA_DIR, "backups")
     os.makedirs(backup_dir, exist_ok=True)
     
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -94,7 +103,7 @@ def backup_settings(url, api_key, custom_name=None):
         return False
 
 def list_backups():
-    backup_dir = "/app/jellybench_data/backups"
+    backup_dir = os.path.join(DATA_DIR, "backups")
     if not os.path.exists(backup_dir):
         return []
     
@@ -112,7 +121,7 @@ def list_backups():
 
 def restore_settings(url, api_key, filename):
     log(f"Restoring settings from {filename}...")
-    backup_dir = "/app/jellybench_data/backups"
+    backup_dir = os.path.join(DATA_DIR, "backups")
     filepath = os.path.join(backup_dir, filename)
     
     if not os.path.exists(filepath):
@@ -129,7 +138,7 @@ def restore_settings(url, api_key, filename):
 
 def delete_backup(filename):
     log(f"Deleting backup {filename}...")
-    backup_dir = "/app/jellybench_data/backups"
+    backup_dir = os.path.join(DATA_DIR, "backups")
     filepath = os.path.join(backup_dir, filename)
     
     if not os.path.exists(filepath):
@@ -149,6 +158,13 @@ def analyze_results():
     Analyzes the latest benchmark result to determine optimal settings.
     Returns a dictionary of recommended Jellyfin configuration changes.
     """
+    recommendations = _analyze_latest_run()
+    if recommendations and "error" not in recommendations:
+        # Decoding settings follow from what the library contains, not from the benchmark
+        recommendations.update(get_library_recommendations())
+    return recommendations
+
+def _analyze_latest_run():
     results = list_results()
     if not results:
         log("analyze_results: No results found in list_results()")
@@ -158,8 +174,17 @@ def analyze_results():
     latest_run = results[0]
     identifier = latest_run['filename']
     log(f"analyze_results: Analyzing latest run: {identifier}")
+
+    # A parallel run measured each device directly, so its pick wins over keyword matching
+    device = get_device_recommendation(identifier)
+    if device:
+        recommendations = dict(device["settings"])
+        recommendations["EnableHardwareEncoding"] = True
+        recommendations["EnableHardwareDecoding"] = True
+        log(f"analyze_results: Using device comparison ({device['device']}, {device['reason']}): {recommendations}")
+        return recommendations
     
-    data_dir = "/app/jellybench_data"
+    data_dir = DATA_DIR
     dir_path = os.path.join(data_dir, identifier)
     
     # Try to read output.json
@@ -235,7 +260,7 @@ def apply_recommendations(url, api_key):
     return set_jellyfin_config(url, api_key, recommendations)
 
 def list_results():
-    data_dir = "/app/jellybench_data"
+    data_dir = DATA_DIR
     results_dir = os.path.join(data_dir, "results") # Keep my own logs too?
     
     items = []
@@ -280,7 +305,7 @@ def list_results():
     return items
 
 def get_result_content(identifier):
-    data_dir = "/app/jellybench_data"
+    data_dir = DATA_DIR
     
     # Check if it's one of my console logs
     if identifier.startswith("results/"):
@@ -338,11 +363,51 @@ def get_result_content(identifier):
             
     return None # Result not found
 
+def _stat_validator(path):
+    try:
+        st = os.stat(path)
+        return (os.path.basename(path), st.st_mtime_ns, st.st_size)
+    except OSError:
+        return (os.path.basename(path), None, None)
+
+def get_results_validator():
+    """
+    Cheap change marker for list_results(): adding or removing runs and
+    console logs updates the mtime of the directories that contain them.
+    """
+    return [_stat_validator(DATA_DIR), _stat_validator(os.path.join(DATA_DIR, "results"))]
+
+def get_backups_validator():
+    return [_stat_validator(os.path.join(DATA_DIR, "backups"))]
+
+def get_result_validator(identifier):
+    """
+    Change marker for get_result_content(identifier), built from the stat
+    of every file it would read instead of reading them.
+    """
+    data_dir = DATA_DIR
+
+    if identifier.startswith("results/"):
+        return [_stat_validator(os.path.join(data_dir, identifier))]
+
+    dir_path = os.path.join(data_dir, identifier)
+    log_dir = os.path.join(dir_path, "log")
+    target_dir = log_dir if os.path.isdir(log_dir) else dir_path
+    validator = [_stat_validator(dir_path), _stat_validator(target_dir)]
+    if os.path.isdir(target_dir):
+        for fname in sorted(os.listdir(target_dir)):
+            if fname.endswith(".log"):
+                validator.append(_stat_validator(os.path.join(target_dir, fname)))
+    return validator
+
+def get_trace_validator(identifier):
+    return [_stat_validator(get_trace_path(os.path.basename(identifier)))]
+
 def create_result_zip(identifier):
     import zipfile
     from io import BytesIO
     
-    data_dir = "/app/jellybench_data"
+    data_dir = DATA_DIR
     
     # Check if it's one of my console logs
     if identifier.startswith("results/"):
@@ -351,6 +416,9 @@ def create_result_zip(identifier):
             buffer = BytesIO()
             with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
                 zip_file.write(filepath, os.path.basename(filepath))
+                for sidecar_path in get_run_sidecar_paths(os.path.basename(filepath)):
+                    if os.path.exists(sidecar_path):
+                        zip_file.write(sidecar_path, os.path.basename(sidecar_path))
             buffer.seek(0)
             return buffer
         return None
@@ -377,7 +445,7 @@ def create_result_zip(identifier):
     return None
 
 def delete_result(identifier):
-    data_dir = "/app/jellybench_data"
+    data_dir = DATA_DIR
     
     # Check if it's one of my console logs
     if identifier.startswith("results/"):
@@ -385,6 +453,9 @@ def delete_result(identifier):
         if os.path.exists(filepath):
             try:
                 os.remove(filepath)
+                for sidecar_path in get_run_sidecar_paths(os.path.basename(filepath)):
+                    if os.path.exists(sidecar_path):
+                        os.remove(sidecar_path)
                 return True
             except Exception as e:
                 log(f"Error deleting file {filepath}: {e}")
@@ -445,34 +516,421 @@ def check_jellyfin_connection(url, api_key):
             return True
         return False
 
+# Fingerprint components each part of the jellybench suite depends on. The
+# Jellyfin version is recorded for reference only: jellybench transcodes with
+# its own ffmpeg, so a server update doesn't invalidate benchmark results.
+FINGERPRINT_GROUPS = {
+    "cpu": ["cpu", "ffmpeg"],
+    "gpu": ["gpu", "driver", "render_nodes", "ffmpeg"],
+}
+
+# jellybench flag that skips the CPU tests when only GPU results need refreshing
+JELLYBENCH_NOCPU_ARG = os.environ.get('JELLYBENCH_NOCPU_ARG', "--nocpu")
+
+# jellybench flag that selects the GPU (by index) a worker benchmarks
+JELLYBENCH_GPU_ARG = os.environ.get('JELLYBENCH_GPU_ARG', "--gpu")
+
+# Delay between starting parallel workers, in seconds
+PARALLEL_START_DELAY = 1.5
+
+def _run_command(cmd, timeout=10):
+    try:
+        r = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        if r.returncode == 0:
+            return r.stdout.strip()
+    except (OSError, subprocess.TimeoutExpired):
+        pass
+    return None
+
+def _read_file(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def get_gpu_info():
+    gpus = []
+    lspci = _run_command(["lspci", "-mm", "-nn"])
+    if lspci:
+        for line in lspci.splitlines():
+            if any(c in line for c in ("VGA compatible controller", "3D controller", "Display controller")):
+                gpus.append(line.split(" ", 1)[1] if " " in line else line)
+
+    nvidia = _run_command(["nvidia-smi", "--query-gpu=name,driver_version", "--format=csv,noheader"])
+    nvidia_gpus = [l.strip() for l in nvidia.splitlines()] if nvidia else []
+    return {"pci": sorted(gpus), "nvidia": nvidia_gpus}
+
+def get_driver_info():
+    nvidia = _read_file("/sys/module/nvidia/version")
+    if not nvidia:
+        smi = _run_command(["nvidia-smi", "--query-gpu=driver_version", "--format=csv,noheader"])
+        nvidia = smi.splitlines()[0].strip() if smi else None
+    # In-tree drivers (i915, xe, amdgpu) ship with the kernel
+    return {"nvidia": nvidia, "kernel": os.uname().release}
+
+def _strip_pci_id(name):
+    # lspci -nn appends numeric ids: "GA102 [GeForce RTX 3090] [2204]"
+    return re.sub(r"\s*\[[0-9a-f]{4}\]$", "", name or "").strip()
+
+def get_display_adapters():
+    """
+    Display adapters in the order jellybench enumerates them (it lists GPUs
+    with lshw's display class), which is what its --gpu index counts. Falls
+    back to lspci's display-class devices where lshw is missing. Each entry
+    has the PCI address (None if not on PCI) and the product name.
+    """
+    out = _run_command(["lshw", "-json", "-quiet", "-class", "display"])
+    if out:
+        try:
+            entries = json.loads(out)
+        except ValueError:
+            # Older lshw prints the objects without the enclosing list
+            try:
+                entries = json.loads(f"[{out}]")
+            except ValueError:
+                entries = None
+        if isinstance(entries, dict):
+            entries = [entries]
+        if entries is not None:
+            adapters = []
+            for entry in entries:
+                businfo = entry.get("businfo") or ""
+                adapters.append({
+                    "pci": businfo[4:].lower() if businfo.startswith("pci@") else None,
+                    "product": entry.get("product"),
+                })
+            return adapters
+
+    adapters = []
+    lspci = _run_command(["lspci", "-D", "-mm", "-nn"])
+    for line in (lspci or "").splitlines():
+        fields = re.findall(r'"([^"]*)"', line)
+        if len(fields) >= 3 and re.search(r"\[03[0-9a-f]{2}\]$", fields[0]):
+            adapters.append({"pci": line.split(" ", 1)[0].lower(), "product": _strip_pci_id(fields[2])})
+    return adapters
+
+def get_render_nodes():
+    nodes = []
+    for node in sorted(glob.glob("/dev/dri/renderD*")):
+        sys_device = os.path.join("/sys/class/drm", os.path.basename(node), "device")
+        driver_link = os.path.join(sys_device, "driver")
+        nodes.append({
+            "node": node,
+            "driver": os.path.basename(os.path.realpath(driver_link)) if os.path.exists(driver_link) else None,
+            "pci": os.path.basename(os.path.realpath(sys_device)) if os.path.exists(sys_device) else None,
+        })
+    return nodes
+
+def get_cpu_info():
+    model = None
+    cpuinfo = _read_file("/proc/cpuinfo") or ""
+    for line in cpuinfo.splitlines():
+        if line.startswith("model name"):
+            model = line.split(":", 1)[1].strip()
+            break
+    return {"model": model, "threads": os.cpu_count()}
+
+def get_board_info():
+    # dmidecode needs root, which the privileged container has
+    return {
+        "product": _run_command(["dmidecode", "-s", "system-product-name"]),
+        "bios": _run_command(["dmidecode", "-s", "bios-version"]),
+    }
+
+def get_ffmpeg_info():
+    ffmpeg_dir = os.path.join(DATA_DIR, "ffmpeg")
+    builds = []
+    for path in sorted(glob.glob(os.path.join(ffmpeg_dir, "*.tar.xz"))):
+        builds.append({"file": os.path.basename(path), "size": os.path.getsize(path)})
+    return builds
+
+def collect_fingerprint(url, api_key):
+    """
+    Captures the hardware and software a benchmark result depends on.
+    Every component is best effort: missing tools yield None/empty values
+    rather than failing the run.
+    """
+    info = get_system_info(url, api_key) if url and api_key else None
+    fingerprint = {
+        "gpu": get_gpu_info(),
+        "driver": get_driver_info(),
+        "render_nodes": get_render_nodes(),
+        "cpu": get_cpu_info(),
+        "board": get_board_info(),
+        "ffmpeg": get_ffmpeg_info(),
+        "jellyfin": info.get("Version") if info else None,
+    }
+    return fingerprint
+
+def save_fingerprint(log_filename, record):
+    path = get_run_sidecar_path(log_filename, ".fingerprint.json")
+    try:
+        with open(path, 'w') as f:
+            json.dump(record, f, indent=4)
+    except Exception as e:
+        log(f"Failed to save fingerprint: {e}")
+
+def find_previous_fingerprint(exclude=None):
+    """Returns the newest fingerprint record of a run that completed successfully."""
+    pattern = os.path.join(DATA_DIR, "results", "*.fingerprint.json")
+    for path in sorted(glob.glob(pattern), reverse=True):
+        if exclude and os.path.basename(path) == exclude:
+            continue
+        try:
+            with open(path, 'r') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if record.get("valid"):
+            return record
+    return None
+
+def plan_benchmark(fingerprint, previous, full=False):
+    """
+    Decides which parts of the suite need to run, based on which fingerprint
+    components changed since the previous valid run. Returns a dict with
+    the groups to run, the jellybench arguments and where reused results
+    come from.
+    """
+    plan = {"run": list(FINGERPRINT_GROUPS), "args": [], "reused": {}, "changed": []}
+    if full or not previous:
+        return plan
+
+    old = previous.get("fingerprint", {})
+    plan["changed"] = sorted(k for k in fingerprint if fingerprint[k] != old.get(k))
+
+    for group, components in FINGERPRINT_GROUPS.items():
+        source = previous.get("sources", {}).get(group)
+        if not source or not os.path.exists(os.path.join(DATA_DIR, source)):
+            continue
+        if all(fingerprint.get(c) == old.get(c) for c in components):
+            plan["reused"][group] = source
+
+    plan["run"] = [g for g in FINGERPRINT_GROUPS if g not in plan["reused"]]
+    if plan["run"] == ["gpu"]:
+        plan["args"] = [JELLYBENCH_NOCPU_ARG]
+    elif plan["run"] == ["cpu"]:
+        # jellybench can't skip only the GPU tests, so run everything
+        plan["run"] = list(FINGERPRINT_GROUPS)
+        plan["reused"] = {}
+    return plan
+
+def write_reused_log(log_filename, sources):
+    """Writes a console log for a run that reused earlier results, so it still shows up and can be analyzed."""
+    results_dir = os.path.join(DATA_DIR, "results")
+    with open(os.path.join(results_dir, log_filename), 'w') as log_file:
+        for source in sorted(set(sources.values())):
+            log_file.write(f"Fingerprint unchanged, reused results from {source}\n\n")
+            try:
+                with open(os.path.join(DATA_DIR, source), 'r') as f:
+                    shutil.copyfileobj(f, log_file)
+            except OSError as e:
+                log_file.write(f"Error reading {source}: {e}\n")
+            log_file.write("\n")
+
 import threading
 
 # Global variables
-_process = None
-_master_fd = None
+_watchdogs = {} # Worker label (None for a single run) -> Watchdog of the running jellybench process
+_master_fds = {} # Worker label -> pty master fd
+_process_lock = threading.Lock()
+_stop_event = threading.Event() # Set by stop_benchmark; checked before anything new is started
+_run_active = False
 _input_event = threading.Event()
 _last_input = None
 _waiting_for_input = False
+_pty_input_spans = {} # Worker label -> open trace span while a prompt awaits input
+_last_returncode = None
+_last_stalls = []
+
+FPS_PATTERN = re.compile(r"\bfps\s*[=:]?\s*(\d+(?:\.\d+)?)", re.IGNORECASE)
+
+# Lines from jellybench that mark the start of a new test
+TEST_START_PATTERN = re.compile(
+    os.environ.get('JELLYBENCH_TEST_PATTERN', r"(?:current|running)\s+test\W*\s*(?P<name>.+)"),
+    re.IGNORECASE
+)
+
+class Tracer:
+    """
+    Records start/end events of timed spans to a JSONL file.
+    Timestamps are monotonic seconds since the tracer was created, so
+    durations are unaffected by wall-clock changes during long runs.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'w')
+        self._lock = threading.Lock()
+        self._t0 = time.monotonic()
+        self._next_id = 1
+        self._starts = {}
+        self._stack = []
+
+    def _write(self, event):
+        self._file.write(json.dumps(event) + "\n")
+        self._file.flush()
+
+    def start(self, name, kind="phase", parent=None, **attrs):
+        with self._lock:
+            span_id = self._next_id
+            self._next_id += 1
+            now = time.monotonic() - self._t0
+            self._starts[span_id] = now
+            self._write({
+                "event": "start",
+                "id": span_id,
+                "parent": parent if parent is not None else (self._stack[-1] if self._stack else None),
+                "name": name,
+                "kind": kind,
+                "t": round(now, 6),
+                "time": datetime.now().isoformat(timespec='milliseconds'),
+                "attrs": attrs,
+            })
+            return span_id
+
+    def end(self, span_id, status="ok", **attrs):
+        with self._lock:
+            if span_id not in self._starts or self._file.closed:
+                return
+            now = time.monotonic() - self._t0
+            self._write({
+                "event": "end",
+                "id": span_id,
+                "t": round(now, 6),
+                "duration": round(now - self._starts.pop(span_id), 6),
+                "status": status,
+                "attrs": attrs,
+            })
+
+    def push(self, span_id):
+        self._stack.append(span_id)
+
+    def pop(self):
+        self._stack.pop()
+
+    def close(self):
+        with self._lock:
+            open_spans = list(self._starts)
+        # Close whatever is still open (e.g. after an error) so the trace stays well-formed
+        for span_id in reversed(open_spans):
+            self.end(span_id, status="aborted")
+        with self._lock:
+            self._file.close()
+
+_tracer = None
+
+def trace_start(name, kind="phase", parent=None, **attrs):
+    if _tracer:
+        return _tracer.start(name, kind, parent, **attrs)
+    return None
+
+def trace_end(span_id, status="ok", **attrs):
+    if _tracer and span_id is not None:
+        _tracer.end(span_id, status, **attrs)
+
+@contextmanager
+def trace_span(name, kind="phase", **attrs):
+    """Traces the enclosed block; spans started inside it become its children."""
+    span_id = trace_start(name, kind, **attrs)
+    if _tracer and span_id is not None:
+        _tracer.push(span_id)
+    status = "ok"
+    try:
+        yield span_id
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        if _tracer and span_id is not None:
+            _tracer.pop()
+        trace_end(span_id, status)
+
+# Files stored next to a console run log (results/run_<ts>.log) that belong to the run
+RUN_SIDECAR_SUFFIXES = (".trace.jsonl", ".fingerprint.json", ".devices.json")
+
+def get_run_sidecar_path(log_filename, suffix):
+    return os.path.join(DATA_DIR, "results", log_filename[:-len(".log")] + suffix)
+
+def get_run_sidecar_paths(log_filename):
+    return [get_run_sidecar_path(log_filename, suffix) for suffix in RUN_SIDECAR_SUFFIXES]
+
+def get_trace_path(log_filename):
+    return get_run_sidecar_path(log_filename, ".trace.jsonl")
+
+def get_result_trace(identifier):
+    """
+    Returns the spans recorded for a console run as a list sorted by start
+    time, or None if the run has no trace. Spans that never ended (e.g. the
+    run is still in progress) are reported up to the latest event.
+    """
+    if not identifier.startswith("results/") or not identifier.endswith(".log"):
+        return None
+    path = get_trace_path(os.path.basename(identifier))
+    if not os.path.exists(path):
+        return None
+
+    spans = {}
+    last_t = 0
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue # Partially written last line
+            last_t = max(last_t, event.get("t", 0))
+            if event.get("event") == "start":
+                spans[event["id"]] = {
+                    "id": event["id"],
+                    "parent": event.get("parent"),
+                    "name": event.get("name"),
+                    "kind": event.get("kind"),
+                    "start": event.get("t"),
+                    "time": event.get("time"),
+                    "end": None,
+                    "duration": None,
+                    "status": "open",
+                    "attrs": event.get("attrs", {}),
+                }
+            elif event.get("event") == "end" and event.get("id") in spans:
+                span = spans[event["id"]]
+                span["end"] = event.get("t")
+                span["duration"] = event.get("duration")
+                span["status"] = event.get("status", "ok")
+                span["attrs"].update(event.get("attrs", {}))
+
+    for span in spans.values():
+        if span["end"] is None:
+            span["end"] = last_t
+            span["duration"] = round(last_t - span["start"], 6)
+    return sorted(spans.values(), key=lambda s: (s["start"], s["id"]))
 
 def wait_for_input(prompt):
     global _waiting_for_input, _last_input
     log(prompt)
+    span_id = trace_start("input", kind="input", prompt=prompt)
     _waiting_for_input = True
     _input_event.clear()
     _input_event.wait()
     _waiting_for_input = False
+    trace_end(span_id, input=_last_input)
     return _last_input
 
 def stop_benchmark():
-    global _process
-    if _process:
+    # Set before taking the snapshot, so a worker registering concurrently sees it
+    _stop_event.set()
+    with _process_lock:
+        watchdogs = list(_watchdogs.values())
+    if watchdogs or _run_active:
         log("Stopping benchmark...")
-        _process.terminate()
+        for watchdog in watchdogs:
+            # Takes ffmpeg grandchildren down too, escalating to SIGKILL if they ignore SIGTERM
+            watchdog.abort()
     else:
         log("No benchmark running to stop.")
 
 def send_input(text):
-    global _master_fd, _waiting_for_input, _last_input
+    global _waiting_for_input, _last_input
     
     if _waiting_for_input:
         _last_input = text
@@ -480,87 +938,399 @@ def send_input(text):
         log(f"Received input: {text}")
         return
 
-    if _master_fd is not None:
-        try:
-            log(f"Sending input: {text}")
-            os.write(_master_fd, (text + "\n").encode())
-        except Exception as e:
-            log(f"Failed to write to pty: {e}")
+    with _process_lock:
+        master_fds = dict(_master_fds)
+    if master_fds:
+        log(f"Sending input: {text}")
+        # Parallel workers ask the same questions, so input goes to all of them
+        for label, master_fd in master_fds.items():
+            try:
+                os.write(master_fd, (text + "\n").encode())
+                trace_end(_pty_input_spans.pop(label, None), input=text)
+            except Exception as e:
+                log(f"Failed to write to pty: {e}")
     else:
         log("No active process to receive input.")
 
-def run_benchmark():
-    global _process, _master_fd
-    log("Starting Jellybench...")
-    
+# Watchdog limits for a jellybench process, in seconds
+STALL_TIMEOUT = float(os.environ.get('JELLYBENCH_STALL_TIMEOUT', 300)) # No output at all
+TEST_TIMEOUT = float(os.environ.get('JELLYBENCH_TEST_TIMEOUT', 1800)) # One test, output or not
+KILL_GRACE = float(os.environ.get('JELLYBENCH_KILL_GRACE', 10)) # SIGTERM -> SIGKILL
+
+# On a stall, kill only the test's encoder processes so jellybench moves on to
+# the next test, instead of stopping the whole run
+CONTINUE_ON_STALL = os.environ.get('JELLYBENCH_CONTINUE_ON_STALL', "1").lower() in ("1", "true", "yes")
+
+def _process_group_pids(pgid):
+    """Live (non-zombie) processes in a process group, or None where /proc isn't available."""
+    if not os.path.isdir("/proc"):
+        return None
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", 'r') as f:
+                # The command name may contain spaces and parentheses; fields resume after the last ')'
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if fields[0] != "Z" and int(fields[2]) == pgid:
+            pids.append(int(entry))
+    return pids
+
+def _signal_group(pgid, sig):
+    try:
+        os.killpg(pgid, sig)
+        return True
+    except ProcessLookupError:
+        return False
+
+def _group_alive(process):
+    # Reap the leader first, or its zombie keeps the group alive
+    process.poll()
+    pids = _process_group_pids(process.pid)
+    if pids is not None:
+        # Orphans that already exited linger as zombies until init reaps them
+        return bool(pids)
+    return _signal_group(process.pid, 0)
+
+def teardown_process_group(process, grace=None):
+    """
+    Sends SIGTERM to everything left in the process's group (jellybench is
+    started in its own session), then SIGKILL after grace seconds, so no
+    ffmpeg keeps a hardware encoder session open. Returns True if anything
+    was still running.
+    """
+    if not _group_alive(process):
+        return False
+    _signal_group(process.pid, signal.SIGTERM)
+    deadline = time.monotonic() + (KILL_GRACE if grace is None else grace)
+    while time.monotonic() < deadline and _group_alive(process):
+        time.sleep(0.1)
+    if _group_alive(process):
+        _signal_group(process.pid, signal.SIGKILL)
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        pass
+    return True
+
+class Watchdog:
+    """
+    Watches a jellybench process group for stalls: no output for
+    stall_timeout seconds, or one test running longer than test_timeout.
+    A stalled test has its encoder processes (everything in the group but
+    jellybench itself) killed so jellybench continues with the next test.
+    If that is disabled or impossible, or the same test stalls again (or,
+    with no test recognised, the group stalls again without any output in
+    between), the whole group is torn down. Time spent waiting at a prompt doesn't count.
+
+    check() is called from the read loop and escalates SIGTERM to SIGKILL
+    after the grace period without blocking it.
+    """
+    def __init__(self, process, stall_timeout=None, test_timeout=None, grace=None, continue_on_stall=None):
+        self.process = process
+        self.stall_timeout = STALL_TIMEOUT if stall_timeout is None else stall_timeout
+        self.test_timeout = TEST_TIMEOUT if test_timeout is None else test_timeout
+        self.grace = KILL_GRACE if grace is None else grace
+        self.continue_on_stall = CONTINUE_ON_STALL if continue_on_stall is None else continue_on_stall
+        self.stalls = []
+        self.aborted = False
+        self.untimed = False # Ran test_timeout seconds without a recognised test
+        self._lock = threading.Lock()
+        now = time.monotonic()
+        self._last_check = now
+        self._last_output = now
+        self._test = None
+        self._test_start = now
+        self._skipped_test = None
+        self._output_since_skip = True
+        self._pending_kill = None # (deadline, pids, or None for the whole group)
+
+    def output(self):
+        self._last_output = time.monotonic()
+        self._output_since_skip = True
+
+    def test_started(self, name):
+        with self._lock:
+            self._test = name
+            self._test_start = time.monotonic()
+
+    def abort(self):
+        """Tears down the whole group: SIGTERM now, SIGKILL after the grace period."""
+        with self._lock:
+            self._abort()
+
+    def _abort(self):
+        if self.aborted:
+            return
+        self.aborted = True
+        _signal_group(self.process.pid, signal.SIGTERM)
+        self._pending_kill = (time.monotonic() + self.grace, None)
+
+    def check(self, waiting_for_input=False):
+        """Returns a stall record when a new stall was detected, otherwise None."""
+        with self._lock:
+            now = time.monotonic()
+            if waiting_for_input:
+                # Shift the timers past the time spent waiting for the user
+                self._last_output += now - self._last_check
+                self._test_start += now - self._last_check
+            self._last_check = now
+
+            if self._pending_kill and now >= self._pending_kill[0]:
+                pids = self._pending_kill[1]
+                self._pending_kill = None
+                if pids is None:
+                    _signal_group(self.process.pid, signal.SIGKILL)
+                else:
+                    for pid in pids:
+                        try:
+                            os.kill(pid, signal.SIGKILL)
+                        except ProcessLookupError:
+                            pass
+
+            if self.aborted or self._pending_kill or waiting_for_input:
+                return None
+
+            if self._test is None and now - self._test_start >= self.test_timeout:
+                self.untimed = True
+
+            if now - self._last_output >= self.stall_timeout:
+                reason, after = "no_output", now - self._last_output
+            elif self._test is not None and now - self._test_start >= self.test_timeout:
+                reason, after = "test_timeout", now - self._test_start
+            else:
+                return None
+
+            stall = {
+                "test": self._test,
+                "reason": reason,
+                "after_s": round(after, 1),
+                "time": datetime.now().isoformat(timespec="seconds"),
+            }
+
+            # Without a test name (none matched yet, e.g. during the download) a
+            # stall only repeats if nothing was printed since the last skip
+            repeated = (self._test is not None and self._test == self._skipped_test) or not self._output_since_skip
+            encoders = None
+            if self.continue_on_stall and not repeated:
+                pids = _process_group_pids(self.process.pid)
+                if pids is not None:
+                    encoders = [pid for pid in pids if pid != self.process.pid]
+
+            if encoders:
+                stall["action"] = "skipped_test"
+                stall["killed"] = len(encoders)
+                self._skipped_test = self._test
+                self._output_since_skip = False
+                for pid in encoders:
+                    try:
+                        os.kill(pid, signal.SIGTERM)
+                    except ProcessLookupError:
+                        pass
+                self._pending_kill = (now + self.grace, encoders)
+                # Give jellybench a fresh window to report the failure and start the next test
+                self._last_output = now
+                self._test_start = now
+            else:
+                stall["action"] = "aborted"
+                self._abort()
+
+            self.stalls.append(stall)
+            return stall
+
+def _run_jellybench(cmd, write_output=None, label=None, env=None, on_line=None, stalls=None):
+    """
+    Runs one jellybench process on its own pty until it exits and returns
+    its exit code. Raw output goes to write_output, complete lines to log()
+    (prefixed with the worker label, if any) and to on_line. Stalls caught
+    by the watchdog are appended to stalls.
+    """
     import pty
     import select
-    
-    # Create a pseudo-terminal
+
+    prefix = f"[{label}] " if label else ""
     master_fd, slave_fd = pty.openpty()
-    _master_fd = master_fd
+    try:
+        process = subprocess.Popen(
+            cmd,
+            stdout=slave_fd,
+            stderr=slave_fd,
+            stdin=slave_fd,
+            text=True,
+            bufsize=1,
+            universal_newlines=True,
+            env=env,
+            preexec_fn=os.setsid # Create new session
+        )
+    except Exception:
+        os.close(master_fd)
+        os.close(slave_fd)
+        raise
+
+    watchdog = Watchdog(process)
+    with _process_lock:
+        _watchdogs[label] = watchdog
+        _master_fds[label] = master_fd
+        if _stop_event.is_set():
+            # Stop was pressed while this process was being started
+            watchdog.abort()
+
+    span_attrs = {"worker": label} if label else {}
+    process_span = trace_start("jellybench", kind="subprocess", cmd=cmd, pid=process.pid, **span_attrs)
+    test_span = None
+    bytes_read = 0
+    idle_time = 0.0
+    untimed_noted = False
+
+    os.close(slave_fd) # Close slave in parent
+
+    def note(msg):
+        # Watchdog messages also go to the run's log, so the stall shows up in its results
+        log(prefix + msg)
+        if write_output:
+            write_output(f"\n[watchdog] {msg}\n")
+        if on_line:
+            on_line(f"[watchdog] {msg}")
+
+    try:
+        # Read loop
+        buffer = ""
+        while True:
+            try:
+                stall = watchdog.check(waiting_for_input=label in _pty_input_spans)
+                if stall:
+                    if stall["action"] == "skipped_test":
+                        what = f"Test '{stall['test']}'" if stall['test'] else "Benchmark"
+                        note(f"{what} stalled ({stall['reason']} after {stall['after_s']}s), "
+                             f"killed {stall['killed']} encoder process(es), continuing with the next test.")
+                    else:
+                        note(f"Benchmark stalled ({stall['reason']} after {stall['after_s']}s"
+                             f"{', test ' + repr(stall['test']) if stall['test'] else ''}), stopping it.")
+                    trace_end(test_span, status="stalled", reason=stall["reason"], action=stall["action"])
+                    test_span = None
+                    if stalls is not None:
+                        stalls.append(stall)
+                if watchdog.untimed and not untimed_noted:
+                    untimed_noted = True
+                    note(f"No test start recognised after {int(watchdog.test_timeout)}s, so the per-test timeout "
+                         "can't apply; set JELLYBENCH_TEST_PATTERN to match jellybench's test lines.")
+
+                select_start = time.monotonic()
+                r, w, e = select.select([master_fd], [], [], 0.1)
+                if master_fd not in r:
+                    idle_time += time.monotonic() - select_start
+                    if process.poll() is not None and not watchdog.aborted and _group_alive(process):
+                        # jellybench exited but something in its group still holds the pty
+                        leftovers = _process_group_pids(process.pid)
+                        note(f"jellybench exited, stopping {len(leftovers) if leftovers else 'its'} leftover process(es).")
+                        watchdog.abort()
+                if master_fd in r:
+                    data = os.read(master_fd, 1024)
+                    if not data:
+                        break
+                    bytes_read += len(data)
+                    watchdog.output()
+                    # Output after a prompt means it wasn't one (e.g. "progress:" then " 10%"), or it
+                    # was answered from the terminal; either way the stall timers apply again
+                    trace_end(_pty_input_spans.pop(label, None), status="output")
+
+                    text = data.decode('utf-8', errors='replace')
+
+                    # Write to file
+                    if write_output:
+                        write_output(text)
+
+                    buffer += text
+
+                    # Process buffer for lines
+                    while '\n' in buffer:
+                        line, buffer = buffer.split('\n', 1)
+                        line = line.strip()
+                        log(prefix + line)
+                        if on_line:
+                            on_line(line)
+
+                        match = TEST_START_PATTERN.search(line)
+                        if match:
+                            trace_end(test_span)
+                            test_span = trace_start(match.group("name").strip() or line, kind="test", parent=process_span, **span_attrs)
+                            watchdog.test_started(match.group("name").strip() or line)
+
+                    # Heuristic for prompts
+                    if buffer.strip().endswith(":"):
+                         prompt = buffer.strip()
+                         log(prefix + prompt)
+                         if on_line:
+                             on_line(prompt)
+                         if label not in _pty_input_spans:
+                             _pty_input_spans[label] = trace_start("input", kind="input", parent=process_span, prompt=prompt, **span_attrs)
+                         buffer = ""
+
+            except OSError:
+                break
+    finally:
+        trace_end(test_span)
+        trace_end(_pty_input_spans.pop(label, None), status="aborted")
+        if process.poll() is None and not watchdog.aborted:
+            try:
+                # The pty reaches EOF as the child exits; give it a moment to be reaped
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                pass
+        # Whatever is left of the group (a hung jellybench, orphaned ffmpeg) must not hold on to the GPU
+        if teardown_process_group(process) and not watchdog.aborted:
+            log(f"{prefix}Stopped leftover benchmark processes.")
+        trace_end(
+            process_span,
+            returncode=process.returncode,
+            bytes_read=bytes_read,
+            idle_s=round(idle_time, 3),
+            stalls=len(watchdog.stalls)
+        )
+        with _process_lock:
+            _watchdogs.pop(label, None)
+            _master_fds.pop(label, None)
+        try:
+            os.close(master_fd)
+        except OSError:
+            pass
+
+    return process.returncode
+
+def run_benchmark(log_filename=None, extra_args=None):
+    global _last_returncode, _last_stalls
+    log("Starting Jellybench...")
+    _last_returncode = None
+    _last_stalls = []
     
     # Setup results directory and log file
-    results_dir = "/app/jellybench_data/results"
+    results_dir = os.path.join(DATA_DIR, "results")
     os.makedirs(results_dir, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_filename = f"run_{timestamp}.log"
+    if not log_filename:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        log_filename = f"run_{timestamp}.log"
     log_filepath = os.path.join(results_dir, log_filename)
     
     try:
         # Check if jellybench is available as a command
-        cmd = ["jellybench", "--ffmpeg", "/app/jellybench_data/ffmpeg"]
+        cmd = ["jellybench", "--ffmpeg", os.path.join(DATA_DIR, "ffmpeg")] + (extra_args or [])
         
+        if _stop_event.is_set():
+            log("Benchmark stopped before it started.")
+            return {}
+
         log(f"Running benchmark command: {' '.join(cmd)}")
         log(f"Saving logs to: {log_filename}")
         
         with open(log_filepath, 'w') as log_file:
-            _process = subprocess.Popen(
-                cmd,
-                stdout=slave_fd,
-                stderr=slave_fd,
-                stdin=slave_fd,
-                text=True,
-                bufsize=1,
-                universal_newlines=True,
-                preexec_fn=os.setsid # Create new session
-            )
-            
-            os.close(slave_fd) # Close slave in parent
-            
-            # Read loop
-            buffer = ""
-            while True:
-                try:
-                    r, w, e = select.select([master_fd], [], [], 0.1)
-                    if master_fd in r:
-                        data = os.read(master_fd, 1024)
-                        if not data:
-                            break
-                        
-                        text = data.decode('utf-8', errors='replace')
-                        
-                        # Write to file
-                        log_file.write(text)
-                        log_file.flush()
-                        
-                        buffer += text
-                        
-                        # Process buffer for lines
-                        while '\n' in buffer:
-                            line, buffer = buffer.split('\n', 1)
-                            log(line.strip())
-                        
-                        # Heuristic for prompts
-                        if buffer.strip().endswith(":"): 
-                             log(buffer.strip())
-                             buffer = ""
-                             
-                except OSError:
-                    break
-                    
-                if _process.poll() is not None:
-                    pass
+            def write_output(text):
+                log_file.write(text)
+                log_file.flush()
+
+            _last_returncode = _run_jellybench(cmd, write_output, stalls=_last_stalls)
 
     except FileNotFoundError:
         log("Error: 'jellybench' command not found.")
@@ -569,18 +1339,967 @@ def run_benchmark():
         log(f"Benchmark failed: {e}")
         return {}
     finally:
-        if _process and _process.poll() is None:
-            _process.terminate()
-        if _master_fd:
+        log("Benchmark process finished.")
+
+def discover_devices():
+    """
+    Lists every GPU a benchmark worker can be pinned to: NVIDIA cards
+    (isolated through CUDA_VISIBLE_DEVICES) and the remaining
+    /dev/dri/renderD* nodes (Intel/AMD). Each gets the --gpu index of its
+    PCI address among the display adapters jellybench enumerates, which
+    also counts adapters Auto-Tune can't use (e.g. a BMC's VGA); devices
+    that can't be found there are left out.
+    """
+    devices = []
+    nvidia_pci = set()
+    nvidia = _run_command(["nvidia-smi", "--query-gpu=index,name,uuid,pci.bus_id", "--format=csv,noheader"])
+    for line in (nvidia or "").splitlines():
+        parts = [p.strip() for p in line.split(",")]
+        if len(parts) != 4:
+            continue
+        index, name, uuid, bus_id = parts
+        # nvidia-smi reports 8-digit PCI domains, sysfs uses 4
+        pci = bus_id.lower()[-12:]
+        nvidia_pci.add(pci)
+        devices.append({
+            "id": f"nvidia{index}",
+            "kind": "nvidia",
+            "name": name,
+            "pci": pci,
+            "node": None,
+            "env": {"CUDA_VISIBLE_DEVICES": uuid, "NVIDIA_VISIBLE_DEVICES": uuid},
+        })
+
+    for node in get_render_nodes():
+        if node["driver"] == "nvidia" or node["pci"] in nvidia_pci:
+            continue # Driven through CUDA above
+        name = _run_command(["lspci", "-s", node["pci"]]) if node["pci"] else None
+        devices.append({
+            "id": os.path.basename(node["node"]),
+            "kind": "qsv" if node["driver"] in ("i915", "xe") else "vaapi",
+            "name": name.split(": ", 1)[-1] if name else node["driver"],
+            "pci": node["pci"],
+            "node": node["node"],
+            "env": {},
+        })
+
+    adapters = get_display_adapters()
+    indexes = {a["pci"]: i for i, a in enumerate(adapters) if a["pci"]}
+    mapped = []
+    for device in devices:
+        if device["pci"] not in indexes:
+            log(f"Skipping {device['id']} ({device['name']}): not among jellybench's display adapters, "
+                "so it can't be selected by index.")
+            continue
+        device["index"] = indexes[device["pci"]]
+        device["product"] = adapters[device["index"]]["product"]
+        mapped.append(device)
+    mapped.sort(key=lambda d: d["index"])
+    return mapped
+
+def _names_device(line, product):
+    return bool(product) and product.lower() in line.lower()
+
+def get_device_settings(device):
+    """Jellyfin settings that point transcoding at the given device."""
+    if device["kind"] == "nvidia":
+        return {"TranscodingTech": "NVENC"}
+    if device["kind"] == "qsv":
+        return {"TranscodingTech": "QSV", "QsvDevice": device["node"]}
+    return {"TranscodingTech": "VAAPI", "VaapiDevice": device["node"]}
+
+def run_parallel_benchmark(log_filename, devices):
+    """
+    Runs one GPU-only jellybench worker per device concurrently, each pinned
+    to its device. Output of all workers goes to one log, prefixed with the
+    device id. Returns per-device results.
+    """
+    global _last_returncode, _last_stalls
+    log(f"Starting {len(devices)} parallel Jellybench workers...")
+    _last_returncode = None
+    _last_stalls = []
+
+    results_dir = os.path.join(DATA_DIR, "results")
+    os.makedirs(results_dir, exist_ok=True)
+    log_filepath = os.path.join(results_dir, log_filename)
+    log(f"Saving logs to: {log_filename}")
+
+    write_lock = threading.Lock()
+    results = {d["id"]: {"returncode": None, "tests": 0, "duration_s": None, "stalls": [], "device_check": "unconfirmed"}
+               for d in devices}
+    # Any adapter jellybench might pick instead, including ones no worker runs on
+    products = {a["product"] for a in get_display_adapters() if a["product"]}
+    samples = {d["id"]: [] for d in devices}
+    current_test = {}
+
+    with open(log_filepath, 'w') as log_file:
+        def worker(device, delay):
+            # jellybench names its result folders by the second; don't start workers in lockstep
+            if _stop_event.wait(delay):
+                log(f"[{device['id']}] Benchmark stopped before this worker started.")
+                return
+            result = results[device["id"]]
+
+            def on_line(line):
+                with write_lock:
+                    log_file.write(f"[{device['id']}] {line}\n")
+                    log_file.flush()
+                # jellybench names the GPU it selected; make sure --gpu picked the card this worker is for
+                if result["device_check"] == "unconfirmed":
+                    if _names_device(line, device["product"]):
+                        result["device_check"] = "confirmed"
+                    elif any(_names_device(line, p) for p in products if p != device["product"]):
+                        result["device_check"] = "mismatch"
+                        log(f"[{device['id']}] jellybench selected a different GPU than {device['product']}; "
+                            "its results won't be used.")
+                match = TEST_START_PATTERN.search(line)
+                if match:
+                    result["tests"] += 1
+                    current_test[device["id"]] = match.group("name").strip()
+                test = current_test.get(device["id"])
+                samples[device["id"]].extend((test, float(m.group(1))) for m in FPS_PATTERN.finditer(line))
+
+            env = dict(os.environ)
+            env.update(device["env"])
+            cmd = ["jellybench", "--ffmpeg", os.path.join(DATA_DIR, "ffmpeg"),
+                   JELLYBENCH_NOCPU_ARG, JELLYBENCH_GPU_ARG, str(device["index"])]
+            log(f"[{device['id']}] Running benchmark command: {' '.join(cmd)}")
+
+            start = time.monotonic()
+            try:
+                result["returncode"] = _run_jellybench(cmd, label=device["id"], env=env, on_line=on_line,
+                                                       stalls=result["stalls"])
+            except FileNotFoundError:
+                log(f"[{device['id']}] Error: 'jellybench' command not found.")
+            except Exception as e:
+                log(f"[{device['id']}] Benchmark failed: {e}")
+            result["duration_s"] = round(time.monotonic() - start, 3)
+            if result["device_check"] == "unconfirmed":
+                log(f"[{device['id']}] jellybench never named {device['product'] or device['name']}; couldn't confirm it benchmarked that GPU.")
+
+        threads = [
+            threading.Thread(target=worker, args=(device, i * PARALLEL_START_DELAY), daemon=True)
+            for i, device in enumerate(devices)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    _last_stalls = [dict(stall, device=device_id) for device_id, r in results.items() for stall in r["stalls"]]
+    codes = [r["returncode"] for r in results.values()]
+    _last_returncode = 0 if codes and all(c == 0 for c in codes) else next((c for c in codes if c != 0), None)
+    log("Benchmark process finished.")
+
+    weights = get_library_weights()
+    device_results = []
+    for device in devices:
+        fps = [f for _, f in samples[device["id"]]]
+        device_results.append(dict(
+            {k: v for k, v in device.items() if k != "env"},
+            mean_fps=round(sum(fps) / len(fps), 2) if fps else None,
+            max_fps=max(fps) if fps else None,
+            weighted_fps=weighted_fps(samples[device["id"]], weights),
+            **results[device["id"]]
+        ))
+    return device_results
+
+def compare_devices(device_results):
+    """
+    Picks the device Jellyfin should use: the fastest among workers that
+    finished successfully on the GPU they were pinned to, by library-weighted fps when a library profile
+    exists (mean fps otherwise), falling back to the most tests completed
+    in the least time when no fps figures were reported.
+    """
+    candidates = [r for r in device_results if r["returncode"] == 0 and r.get("device_check") != "mismatch"]
+    # A device whose encoder hung is a poor pick even if its other tests were fast
+    candidates = [r for r in candidates if not r.get("stalls")] or candidates
+    if not candidates:
+        return None
+    weighted = all(r.get("weighted_fps") is not None for r in candidates)
+    score_key = "weighted_fps" if weighted else "mean_fps"
+    best = max(candidates, key=lambda r: (
+        r[score_key] is not None,
+        r[score_key] or 0,
+        r["tests"],
+        -(r["duration_s"] or 0)
+    ))
+    if best[score_key] is None:
+        reason = f"{best['tests']} tests in {best['duration_s']}s"
+    elif weighted:
+        reason = f"{best['weighted_fps']} fps weighted by library"
+    else:
+        reason = f"{best['mean_fps']} fps average"
+    return {
+        "device": best["id"],
+        "name": best["name"],
+        "node": best["node"],
+        "reason": reason,
+        "settings": get_device_settings(best),
+    }
+
+def save_device_comparison(log_filename, device_results, recommended):
+    log("Per-device comparison:")
+    for r in device_results:
+        fps = f"{r['mean_fps']} fps avg / {r['max_fps']} max" if r["mean_fps"] is not None else "no fps reported"
+        if r.get("weighted_fps") is not None:
+            fps += f" / {r['weighted_fps']} library-weighted"
+        status = "ok" if r["returncode"] == 0 else f"failed ({r['returncode']})"
+        if r.get("stalls"):
+            status += f", {len(r['stalls'])} stall(s)"
+        if r.get("device_check") in ("mismatch", "unconfirmed"):
+            status += f", device {r['device_check']}"
+        log(f"  {r['id']:<12} {r['name'] or '':<40} {r['tests']:>3} tests  {fps}  {r['duration_s']}s  {status}")
+    if recommended:
+        settings = ", ".join(f"{k}={v}" for k, v in recommended["settings"].items())
+        log(f"Recommended device: {recommended['device']} ({recommended['reason']}) -> {settings}")
+    else:
+        log("No device completed its benchmark successfully.")
+
+    path = get_run_sidecar_path(log_filename, ".devices.json")
+    try:
+        with open(path, 'w') as f:
+            json.dump({"devices": device_results, "recommended": recommended}, f, indent=4)
+    except Exception as e:
+        log(f"Failed to save device comparison: {e}")
+
+def get_device_recommendation(identifier):
+    if not identifier.startswith("results/") or not identifier.endswith(".log"):
+        return None
+    path = get_run_sidecar_path(os.path.basename(identifier), ".devices.json")
+    try:
+        with open(path, 'r') as f:
+            return json.load(f).get("recommended")
+    except (OSError, ValueError):
+        return None
+
+# Library profiling: what the Jellyfin libraries contain, used to weight benchmark results
+LIBRARY_PAGE_SIZE = int(os.environ.get('JELLYFIN_ITEMS_PAGE_SIZE', 1000))
+LIBRARY_CONCURRENCY = int(os.environ.get('JELLYFIN_ITEMS_CONCURRENCY', 4))
+LIBRARY_ITEM_TYPES = "Movie,Episode,MusicVideo,Video"
+
+# Save scan progress every this many pages so an interrupted scan can resume
+LIBRARY_CHECKPOINT_PAGES = 10
+
+# Tokens in jellybench test names, mapped to the buckets used in the library histogram
+TEST_CODECS = {
+    "h264": ("h264", "avc", "x264"),
+    "hevc": ("hevc", "h265", "x265"),
+    "av1": ("av1",),
+    "vp9": ("vp9",),
+    "mpeg2video": ("mpeg2",),
+    "vc1": ("vc1",),
+}
+TEST_RESOLUTIONS = {
+    "2160p": ("2160p", "4k", "uhd"),
+    "1080p": ("1080p", "fhd"),
+    "720p": ("720p",),
+    "sd": ("576p", "480p", "sd"),
+}
+
+_library_lock = threading.Lock()
+
+def get_library_profile_path():
+    return os.path.join(DATA_DIR, "library_profile.json")
+
+def get_library_rescan_path():
+    # A full rescan builds its profile here, so the complete one stays in use until it finishes
+    return os.path.join(DATA_DIR, "library_profile.rescan.json")
+
+def load_library_profile(path=None):
+    try:
+        with open(path or get_library_profile_path(), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _save_library_profile(profile, path=None):
+    path = path or get_library_profile_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    profile["histogram"] = _build_histogram(profile)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(profile, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+def get_library_validator():
+    return [_stat_validator(get_library_profile_path())]
+
+def is_library_scanning():
+    return _library_lock.locked()
+
+def _resolution_bucket(width, height):
+    width = width or 0
+    height = height or 0
+    # Either dimension counts, so scope and cropped releases land in the right bucket
+    if width >= 3200 or height >= 1800:
+        return "2160p"
+    if width >= 1700 or height >= 1000:
+        return "1080p"
+    if width >= 1100 or height >= 650:
+        return "720p"
+    return "sd"
+
+def classify_item(item):
+    """
+    Histogram bucket of an item's primary video stream, e.g.
+    "hevc|2160p|10|HDR10", or None if the item has no video stream.
+    """
+    streams = item.get("MediaStreams")
+    if streams is None:
+        sources = item.get("MediaSources") or [{}]
+        streams = sources[0].get("MediaStreams") or []
+    for stream in streams:
+        if stream.get("Type") != "Video":
+            continue
+        codec = (stream.get("Codec") or "unknown").lower()
+        resolution = _resolution_bucket(stream.get("Width"), stream.get("Height"))
+        bit_depth = stream.get("BitDepth") or 8
+        video_range = stream.get("VideoRange") or "SDR"
+        if video_range != "SDR":
+            video_range = stream.get("VideoRangeType") or video_range
+        return f"{codec}|{resolution}|{bit_depth}|{video_range}"
+    return None
+
+def _build_histogram(profile):
+    histogram = {}
+    for bucket_index, minutes in profile["items"].values():
+        entry = histogram.setdefault(profile["buckets"][bucket_index], {"items": 0, "minutes": 0})
+        entry["items"] += 1
+        entry["minutes"] += minutes
+    return histogram
+
+def scan_library(url, api_key, full=False, stop_event=None):
+    """
+    Walks the Jellyfin /Items API in pages of LIBRARY_PAGE_SIZE with up to
+    LIBRARY_CONCURRENCY requests in flight and folds each item's primary
+    video stream into the library histogram. Pages are processed in order
+    and dropped, so only an item id -> bucket map is kept.
+
+    Unless full is set, only items saved since the last completed scan are
+    fetched, and an interrupted scan resumes from its last checkpoint. A
+    full rescan checkpoints to a separate file and replaces the profile
+    only once it completes.
+    Setting stop_event interrupts the scan after the current page.
+    Returns the profile, or None if the scan failed, was stopped or one is
+    already running.
+    """
+    if not _library_lock.acquire(blocking=False):
+        log("A library scan is already running.")
+        return None
+
+    try:
+        # An interrupted full rescan is resumed before any incremental scan
+        rescan = None if full else load_library_profile(get_library_rescan_path())
+        if full or rescan:
+            path = get_library_rescan_path()
+            profile = rescan
+        else:
+            path = get_library_profile_path()
+            profile = load_library_profile(path)
+        if not profile:
+            profile = {"buckets": [], "items": {}, "cutoff": None, "cursor": None}
+
+        cursor = profile.get("cursor")
+        if cursor:
+            log(f"Resuming library scan at item {cursor['start_index']}...")
+        else:
+            cursor = {
+                "start_index": 0,
+                "since": profile.get("cutoff"),
+                "started": datetime.now(timezone.utc).isoformat(),
+            }
+            log("Scanning library changes since last scan..." if cursor["since"] else "Scanning library...")
+        profile["cursor"] = cursor
+
+        params = {
+            "Recursive": "true",
+            "IncludeItemTypes": LIBRARY_ITEM_TYPES,
+            "Fields": "MediaStreams",
+            "SortBy": "DateCreated,SortName",
+            "SortOrder": "Ascending",
+            "EnableImages": "false",
+            "EnableUserData": "false",
+            "EnableTotalRecordCount": "true",
+            "Limit": LIBRARY_PAGE_SIZE,
+        }
+        if cursor["since"]:
+            params["MinDateLastSaved"] = cursor["since"]
+
+        session = requests.Session()
+        session.headers['X-Emby-Token'] = api_key
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=LIBRARY_CONCURRENCY)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        def fetch(start_index):
+            r = session.get(f"{url}/Items", params=dict(params, StartIndex=start_index), timeout=60)
+            r.raise_for_status()
+            return r.json()
+
+        bucket_index = {bucket: i for i, bucket in enumerate(profile["buckets"])}
+        items = profile["items"]
+        scanned = 0
+        pages = 0
+
+        page_start = cursor["start_index"]
+        page = fetch(page_start)
+        total = page.get("TotalRecordCount", 0)
+        next_starts = iter(range(page_start + LIBRARY_PAGE_SIZE, total, LIBRARY_PAGE_SIZE))
+        pending = deque()
+        stopped = False
+
+        with ThreadPoolExecutor(max_workers=LIBRARY_CONCURRENCY) as pool:
+            try:
+                while page is not None:
+                    if stop_event is not None and stop_event.is_set():
+                        stopped = True
+                        break
+
+                    # Keep the pool busy while this page is folded in
+                    while len(pending) < LIBRARY_CONCURRENCY:
+                        start = next(next_starts, None)
+                        if start is None:
+                            break
+                        pending.append((start, pool.submit(fetch, start)))
+
+                    for item in page.get("Items") or []:
+                        bucket = classify_item(item)
+                        if bucket is None or not item.get("Id"):
+                            continue
+                        if bucket not in bucket_index:
+                            bucket_index[bucket] = len(profile["buckets"])
+                            profile["buckets"].append(bucket)
+                        minutes = round((item.get("RunTimeTicks") or 0) / 600000000)
+                        items[item["Id"]] = [bucket_index[bucket], minutes]
+                        scanned += 1
+
+                    pages += 1
+                    cursor["start_index"] = page_start + LIBRARY_PAGE_SIZE
+                    if pages % LIBRARY_CHECKPOINT_PAGES == 0:
+                        _save_library_profile(profile, path)
+                        log(f"Library scan: {min(cursor['start_index'], total)}/{total} items")
+
+                    if pending:
+                        page_start, future = pending.popleft()
+                        page = future.result()
+                    else:
+                        page = None
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+        if stopped:
+            _save_library_profile(profile, path)
+            log("Library scan stopped; the next scan resumes it.")
+            return None
+
+        profile["cutoff"] = cursor["started"]
+        profile["cursor"] = None
+        profile["scanned_at"] = datetime.now(timezone.utc).isoformat()
+        _save_library_profile(profile)
+        if path != get_library_profile_path():
+            os.remove(path)
+        log(f"Library scan complete: {scanned} new or changed items, {len(items)} in profile.")
+        return profile
+    except Exception as e:
+        log(f"Library scan failed: {e}")
+        try:
+            # Keep what was fetched; the next scan continues from the cursor
+            if profile["items"]:
+                _save_library_profile(profile, path)
+        except Exception:
+            pass
+        return None
+    finally:
+        _library_lock.release()
+
+def get_library_summary():
+    """Histogram of the stored library profile for the dashboard, largest share first."""
+    profile = load_library_profile()
+    if not profile:
+        return {"scanning": is_library_scanning(), "histogram": []}
+
+    histogram = profile.get("histogram") or _build_histogram(profile)
+    weights = _bucket_weights(histogram)
+    rows = []
+    for bucket, entry in histogram.items():
+        codec, resolution, bit_depth, video_range = bucket.split("|")
+        rows.append({
+            "codec": codec,
+            "resolution": resolution,
+            "bit_depth": int(bit_depth),
+            "range": video_range,
+            "items": entry["items"],
+            "hours": round(entry["minutes"] / 60, 1),
+            "share": round(weights[bucket], 4),
+        })
+    rows.sort(key=lambda r: r["share"], reverse=True)
+    return {
+        "scanning": is_library_scanning(),
+        "scanned_at": profile.get("scanned_at"),
+        "resumable": profile.get("cursor") is not None,
+        "total_items": len(profile.get("items") or {}),
+        "histogram": rows,
+    }
+
+def _bucket_weights(histogram):
+    # Runtime is the better proxy for what gets played; fall back to item counts
+    # for libraries without runtime metadata
+    field = "minutes" if sum(e["minutes"] for e in histogram.values()) else "items"
+    total = sum(e[field] for e in histogram.values()) or 1
+    return {bucket: e[field] / total for bucket, e in histogram.items()}
+
+def get_library_weights(profile=None):
+    """Share of the library per (codec, resolution), or {} without a profile."""
+    profile = profile or load_library_profile()
+    if not profile or not profile.get("items"):
+        return {}
+    weights = {}
+    for bucket, share in _bucket_weights(profile.get("histogram") or _build_histogram(profile)).items():
+        codec, resolution = bucket.split("|")[:2]
+        weights[(codec, resolution)] = weights.get((codec, resolution), 0) + share
+    return weights
+
+def classify_test(name):
+    """(codec, resolution) a jellybench test name refers to; either can be None."""
+    tokens = set(re.split(r"[^a-z0-9]+", name.lower()))
+    codec = next((c for c, aliases in TEST_CODECS.items() if tokens.intersection(aliases)), None)
+    resolution = next((r for r, aliases in TEST_RESOLUTIONS.items() if tokens.intersection(aliases)), None)
+    return codec, resolution
+
+def weighted_fps(samples, weights):
+    """
+    Average fps of (test name, fps) samples, each test weighted by how much
+    of the library matches its source codec and resolution. Returns None if
+    no test matches anything in the library.
+    """
+    total = 0.0
+    weight_sum = 0.0
+    for test, fps in samples:
+        codec, resolution = classify_test(test or "")
+        if codec is None and resolution is None:
+            continue
+        weight = sum(
+            share for (c, r), share in weights.items()
+            if (codec is None or c == codec) and (resolution is None or r == resolution)
+        )
+        total += weight * fps
+        weight_sum += weight
+    if not weight_sum:
+        return None
+    return round(total / weight_sum, 2)
+
+def parse_test_fps(text):
+    """(test name, fps) for every fps figure in a jellybench log."""
+    samples = []
+    test = None
+    for line in text.splitlines():
+        match = TEST_START_PATTERN.search(line)
+        if match:
+            test = match.group("name").strip()
+        samples.extend((test, float(m.group(1))) for m in FPS_PATTERN.finditer(line))
+    return samples
+
+def get_library_recommendations(profile=None):
+    """Decoding settings the library calls for (10-bit decoding, HDR tone mapping)."""
+    weights = _bucket_weights((profile or load_library_profile() or {}).get("histogram") or {})
+    recommendations = {}
+    shares = {}
+    for bucket, share in weights.items():
+        codec, _, bit_depth, video_range = bucket.split("|")
+        if int(bit_depth) >= 10:
+            shares[codec + "10"] = shares.get(codec + "10", 0) + share
+        if video_range != "SDR":
+            shares["hdr"] = shares.get("hdr", 0) + share
+    if shares.get("hevc10"):
+        recommendations["EnableDecodingColorDepth10Hevc"] = True
+    if shares.get("vp910"):
+        recommendations["EnableDecodingColorDepth10Vp9"] = True
+    # HDR sources transcoded for SDR clients look washed out without tone mapping
+    if shares.get("hdr", 0) >= 0.01:
+        recommendations["EnableTonemapping"] = True
+    return recommendations
+
+def log_library_weighted_results(log_filename=None):
+    weights = get_library_weights()
+    if not weights:
+        return
+    top = sorted(weights.items(), key=lambda kv: kv[1], reverse=True)[:3]
+    log("Library workload: " + ", ".join(f"{c} {r} {share:.0%}" for (c, r), share in top))
+    if not log_filename:
+        return
+    try:
+        with open(os.path.join(DATA_DIR, "results", log_filename), 'r', errors='replace') as f:
+            samples = parse_test_fps(f.read())
+    except OSError:
+        return
+    score = weighted_fps(samples, weights)
+    if score is not None:
+        log(f"Library-weighted fps: {score}")
+
+# Live transcoding telemetry, polled from Jellyfin's /Sessions
+TELEMETRY_INTERVAL = float(os.environ.get('JELLYFIN_TELEMETRY_INTERVAL', 15))
+TELEMETRY_RETENTION_DAYS = int(os.environ.get('JELLYFIN_TELEMETRY_RETENTION_DAYS', 14))
+
+_collector = None
+
+# Aggregates of whole day files, extended as the current day's file grows, and
+# the last summary, so dashboards refreshing within one interval share it
+_telemetry_lock = threading.Lock()
+_telemetry_files = {} # path -> {"aggregate", "offset"}
+_telemetry_summary = (None, None) # (key, summary)
+
+def get_telemetry_dir():
+    return os.path.join(DATA_DIR, "telemetry")
+
+def get_telemetry_validator():
+    return [_stat_validator(path) for path in sorted(glob.glob(os.path.join(get_telemetry_dir(), "sessions-*.jsonl")))]
+
+def get_active_sessions(url, api_key):
+    headers = {'X-Emby-Token': api_key}
+    sessions_url = f"{url}/Sessions"
+    r = requests.get(sessions_url, headers=headers, params={"ActiveWithinSeconds": 960}, timeout=10)
+    r.raise_for_status()
+    return r.json()
+
+def _video_stream(item):
+    for stream in (item or {}).get("MediaStreams") or []:
+        if stream.get("Type") == "Video":
+            return stream
+    return {}
+
+def summarize_transcode(session):
+    """Compact telemetry record of a session's transcode, or None if it isn't transcoding video."""
+    info = session.get("TranscodingInfo")
+    if not info or info.get("IsVideoDirect"):
+        return None
+    source = _video_stream(session.get("NowPlayingItem"))
+    fps = info.get("Framerate")
+    source_fps = source.get("RealFrameRate") or source.get("AverageFrameRate")
+    video_range = source.get("VideoRange") or "SDR"
+    if video_range != "SDR":
+        video_range = source.get("VideoRangeType") or video_range
+    return {
+        "id": (session.get("Id") or "")[:8],
+        "src": (source.get("Codec") or "unknown").lower(),
+        "src_res": _resolution_bucket(source.get("Width"), source.get("Height")),
+        "range": video_range,
+        "dst": (info.get("VideoCodec") or "unknown").lower(),
+        "dst_res": _resolution_bucket(info.get("Width"), info.get("Height")),
+        "fps": round(fps, 1) if fps else None,
+        # Speed relative to real time; below 1.0 the client catches up and buffers
+        "speed": round(fps / source_fps, 2) if fps and source_fps else None,
+        "pct": round(info.get("CompletionPercentage") or 0, 1),
+        "hw": info.get("HardwareAccelerationType") or "none",
+        "reasons": info.get("TranscodeReasons") or [],
+        "paused": bool((session.get("PlayState") or {}).get("IsPaused")),
+    }
+
+class SessionCollector:
+    """
+    Polls /Sessions every interval seconds and appends one line per poll to
+    a daily JSONL file in the telemetry directory while anything is being
+    transcoded (plus one idle line when it stops).
+    """
+    def __init__(self, url, api_key, interval=TELEMETRY_INTERVAL):
+        self.url = url
+        self.api_key = api_key
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._was_active = False
+        self._failing = False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+
+    def _run(self):
+        log(f"Collecting transcoding telemetry every {self.interval:g}s.")
+        while not self._stop.is_set():
+            self.poll()
+            self._stop.wait(self.interval)
+
+    def poll(self):
+        try:
+            sessions = get_active_sessions(self.url, self.api_key)
+        except Exception as e:
+            # Only report the first failure, not every poll of an outage
+            if not self._failing:
+                log(f"Telemetry: failed to poll sessions: {e}")
+                self._failing = True
+            return None
+        if self._failing:
+            log("Telemetry: polling sessions again.")
+            self._failing = False
+
+        transcodes = [t for t in (summarize_transcode(s) for s in sessions) if t]
+        if not transcodes and not self._was_active:
+            return None
+        self._was_active = bool(transcodes)
+
+        now = datetime.now()
+        sample = {"t": round(time.time(), 1), "sessions": len(sessions), "transcodes": transcodes}
+        try:
+            os.makedirs(get_telemetry_dir(), exist_ok=True)
+            path = os.path.join(get_telemetry_dir(), f"sessions-{now.strftime('%Y%m%d')}.jsonl")
+            if not os.path.exists(path):
+                prune_telemetry(now)
+            with open(path, 'a') as f:
+                f.write(json.dumps(sample, separators=(",", ":")) + "\n")
+        except OSError as e:
+            log(f"Telemetry: failed to write sample: {e}")
+        return sample
+
+def prune_telemetry(now=None):
+    cutoff = ((now or datetime.now()) - timedelta(days=TELEMETRY_RETENTION_DAYS)).strftime('%Y%m%d')
+    for path in glob.glob(os.path.join(get_telemetry_dir(), "sessions-*.jsonl")):
+        if os.path.basename(path)[len("sessions-"):-len(".jsonl")] < cutoff:
             try:
-                os.close(_master_fd)
-            except:
+                os.remove(path)
+            except OSError:
                 pass
-        _process = None
-        _master_fd = None
-        log("Benchmark process finished.")
 
-def analyze_results(results):
+def start_telemetry(url, api_key):
+    global _collector
+    if not url or not api_key or TELEMETRY_INTERVAL <= 0 or _collector:
+        return None
+    _collector = SessionCollector(url, api_key)
+    _collector.start()
+    return _collector
+
+def stop_telemetry():
+    global _collector
+    if _collector:
+        _collector.stop()
+        _collector = None
+
+def _read_telemetry_file(path, since=0):
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    sample = json.loads(line)
+                except ValueError:
+                    continue # Partially written last line
+                if sample.get("t", 0) >= since:
+                    yield sample
+    except OSError:
+        return
+
+def read_telemetry(days=7):
+    """Yields stored samples from the last days, oldest first."""
+    since = time.time() - days * 86400
+    for path in sorted(glob.glob(os.path.join(get_telemetry_dir(), "sessions-*.jsonl"))):
+        yield from _read_telemetry_file(path, since)
+
+def _telemetry_file_day(path):
+    """Local-time start and end of the day a sessions-YYYYMMDD.jsonl file covers, or None."""
+    try:
+        day = datetime.strptime(os.path.basename(path)[len("sessions-"):-len(".jsonl")], '%Y%m%d')
+    except ValueError:
+        return None
+    return day.timestamp(), (day + timedelta(days=1)).timestamp()
+
+def _new_telemetry_aggregate():
+    return {"samples": 0, "latest": None, "peak": {"transcodes": 0, "t": None}, "paths": {}, "slow": {}}
+
+def _add_telemetry_sample(aggregate, sample):
+    aggregate["samples"] += 1
+    aggregate["latest"] = sample
+    transcodes = sample["transcodes"]
+    if len(transcodes) > aggregate["peak"]["transcodes"]:
+        aggregate["peak"] = {"transcodes": len(transcodes), "t": sample["t"]}
+    for t in transcodes:
+        if t["paused"] or not t["fps"]:
+            continue
+        key = (t["src"], t["src_res"], t["range"], t["dst"], t["dst_res"])
+        entry = aggregate["paths"].setdefault(key, {
+            "samples": 0, "fps": 0.0, "min_fps": None, "speed": 0.0, "speeds": 0, "slow_samples": 0, "hw": set()
+        })
+        entry["samples"] += 1
+        entry["fps"] += t["fps"]
+        entry["min_fps"] = t["fps"] if entry["min_fps"] is None else min(entry["min_fps"], t["fps"])
+        entry["hw"].add(t["hw"])
+        if t["speed"] is not None:
+            entry["speed"] += t["speed"]
+            entry["speeds"] += 1
+            if t["speed"] < 1.0:
+                entry["slow_samples"] += 1
+                s = aggregate["slow"].setdefault(t["id"], dict(t, first=sample["t"], min_speed=t["speed"], samples=0))
+                s.update(last=sample["t"], min_speed=min(s["min_speed"], t["speed"]), samples=s["samples"] + 1)
+
+def _merge_telemetry_aggregate(total, part):
+    # part is newer than everything already in total
+    total["samples"] += part["samples"]
+    total["latest"] = part["latest"] or total["latest"]
+    if part["peak"]["transcodes"] > total["peak"]["transcodes"]:
+        total["peak"] = part["peak"]
+    for key, entry in part["paths"].items():
+        merged = total["paths"].get(key)
+        if merged is None:
+            total["paths"][key] = dict(entry, hw=set(entry["hw"]))
+            continue
+        for field in ("samples", "fps", "speed", "speeds", "slow_samples"):
+            merged[field] += entry[field]
+        merged["min_fps"] = min(merged["min_fps"], entry["min_fps"])
+        merged["hw"] |= entry["hw"]
+    for transcode_id, entry in part["slow"].items():
+        merged = total["slow"].get(transcode_id)
+        if merged is None:
+            total["slow"][transcode_id] = dict(entry)
+        else:
+            merged.update(last=entry["last"], min_speed=min(merged["min_speed"], entry["min_speed"]),
+                          samples=merged["samples"] + entry["samples"])
+
+def _telemetry_file_aggregate(path):
+    """Aggregate of a whole day file, reading only what was appended since the last call."""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return None
+    cached = _telemetry_files.get(path)
+    if cached is None or size < cached["offset"]:
+        cached = {"aggregate": _new_telemetry_aggregate(), "offset": 0}
+        _telemetry_files[path] = cached
+    if size > cached["offset"]:
+        try:
+            with open(path, 'rb') as f:
+                f.seek(cached["offset"])
+                data = f.read(size - cached["offset"])
+        except OSError:
+            return None
+        # A partially written last line is read once it's complete
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                _add_telemetry_sample(cached["aggregate"], json.loads(line))
+            except ValueError:
+                continue
+        cached["offset"] += end
+    return cached["aggregate"]
+
+def get_benchmark_predictions():
+    """
+    Mean fps per (codec, resolution) test of the newest valid benchmark on
+    this host. Parallel runs only count the recommended device.
+    """
+    previous = find_previous_fingerprint()
+    identifier = (previous or {}).get("sources", {}).get("gpu")
+    if not identifier:
+        return None, {}
+    try:
+        with open(os.path.join(DATA_DIR, identifier), 'r', errors='replace') as f:
+            text = f.read()
+    except OSError:
+        return identifier, {}
+
+    device = get_device_recommendation(identifier)
+    if device:
+        prefix = f"[{device['device']}] "
+        text = "\n".join(line[len(prefix):] for line in text.splitlines() if line.startswith(prefix))
+
+    grouped = {}
+    for test, fps in parse_test_fps(text):
+        codec, resolution = classify_test(test or "")
+        if codec:
+            grouped.setdefault((codec, resolution), []).append(fps)
+    return identifier, {key: sum(v) / len(v) for key, v in grouped.items()}
+
+def _predicted_fps(predictions, codec, resolution):
+    # Tests that don't name a resolution stand in for any resolution of their codec
+    for key in ((codec, resolution), (codec, None)):
+        if key in predictions:
+            return round(predictions[key], 1)
+    return None
+
+def get_telemetry_summary(days=7):
+    """
+    Aggregates stored telemetry for the dashboard: current and peak
+    concurrency, real fps per source -> target codec path next to the
+    benchmark's prediction for the same source, and transcodes that ran
+    slower than real time.
+
+    The result is reused until the stored samples, the benchmark results or
+    the current poll interval change. Whole days inside the window are
+    aggregated once and then only extended as their file grows.
+    """
+    global _telemetry_summary
+    now = time.time()
+    key = (
+        tuple(get_telemetry_validator()),
+        tuple(get_results_validator()),
+        days,
+        int(now // max(TELEMETRY_INTERVAL, 1)),
+        _collector is not None,
+    )
+    with _telemetry_lock:
+        if _telemetry_summary[0] == key:
+            return _telemetry_summary[1]
+        summary = _build_telemetry_summary(days, now)
+        _telemetry_summary = (key, summary)
+        return summary
+
+def _build_telemetry_summary(days, now):
+    since = now - days * 86400
+    total = _new_telemetry_aggregate()
+    paths = sorted(glob.glob(os.path.join(get_telemetry_dir(), "sessions-*.jsonl")))
+    for path in paths:
+        day = _telemetry_file_day(path)
+        if day and day[1] <= since:
+            continue
+        if day and day[0] >= since:
+            part = _telemetry_file_aggregate(path)
+        else:
+            # The window starts inside this day; only part of it counts
+            part = _new_telemetry_aggregate()
+            for sample in _read_telemetry_file(path, since):
+                _add_telemetry_sample(part, sample)
+        if part:
+            _merge_telemetry_aggregate(total, part)
+    for path in set(_telemetry_files) - set(paths):
+        del _telemetry_files[path] # Pruned
+
+    latest = total["latest"]
+    peak = total["peak"]
+    identifier, predictions = get_benchmark_predictions()
+    rows = []
+    for (src, src_res, video_range, dst, dst_res), entry in total["paths"].items():
+        rows.append({
+            "source": f"{src} {src_res} {video_range}",
+            "target": f"{dst} {dst_res}",
+            "samples": entry["samples"],
+            "mean_fps": round(entry["fps"] / entry["samples"], 1),
+            "min_fps": entry["min_fps"],
+            "mean_speed": round(entry["speed"] / entry["speeds"], 2) if entry["speeds"] else None,
+            "slow_samples": entry["slow_samples"],
+            "hw": sorted(entry["hw"]),
+            "predicted_fps": _predicted_fps(predictions, src, src_res),
+        })
+    rows.sort(key=lambda r: r["samples"], reverse=True)
+
+    # Only a recent sample describes what is playing right now
+    current = latest["transcodes"] if latest and now - latest["t"] < 3 * max(TELEMETRY_INTERVAL, 1) else []
+    return {
+        "enabled": _collector is not None,
+        "interval": TELEMETRY_INTERVAL,
+        "days": days,
+        "samples": total["samples"],
+        "current": current,
+        "peak_concurrency": peak["transcodes"],
+        "peak_at": peak["t"],
+        "paths": rows,
+        "slow": sorted(total["slow"].values(), key=lambda s: s["last"], reverse=True)[:20],
+        "benchmark": identifier,
+    }
+
+def analyze_benchmark_results(results):
     log("Analyzing results...")
     if not results:
         log("No results to analyze.")
@@ -593,17 +2312,102 @@ def analyze_results(results):
     log(f"Analysis Complete")
     log(f"Recommendation: {best_codec} is the fastest with {best_fps}fps.")
 
-def run_optimization_process(url, api_key):
+def run_optimization_process(url, api_key, full=False, parallel=False):
+    global _tracer, _run_active
     if not url or not api_key:
         log("Error: JELLYFIN_URL and JELLYFIN_API_KEY must be set.")
         return
-        
-    if not check_jellyfin_connection(url, api_key):
-        return
-        
-    setup_ffmpeg()
-    results = run_benchmark()
-    analyze_results(results)
+
+    _stop_event.clear()
+    _run_active = True
+
+    # The trace is stored next to the run's console log in results/
+    results_dir = os.path.join(DATA_DIR, "results")
+    os.makedirs(results_dir, exist_ok=True)
+    log_filename = f"run_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+    _tracer = Tracer(get_trace_path(log_filename))
+
+    try:
+        with trace_span("run", kind="run", log=log_filename):
+            with trace_span("connection_check"):
+                connected = check_jellyfin_connection(url, api_key)
+            if not connected:
+                return
+
+            with trace_span("setup_ffmpeg"):
+                setup_ffmpeg()
+
+            with trace_span("library_profile"):
+                scan_library(url, api_key, stop_event=_stop_event)
+            if _stop_event.is_set():
+                log("Run stopped.")
+                return
+
+            with trace_span("fingerprint"):
+                fingerprint = collect_fingerprint(url, api_key)
+                previous = find_previous_fingerprint()
+                plan = plan_benchmark(fingerprint, previous, full)
+
+            identifier = "results/" + log_filename
+            record = {
+                "fingerprint": fingerprint,
+                "changed": plan["changed"],
+                "reused": plan["reused"],
+                "executed": plan["run"],
+                "sources": dict(plan["reused"]),
+                "valid": False,
+            }
+
+            devices = []
+            if parallel:
+                devices = discover_devices()
+                if devices:
+                    log(f"Found {len(devices)} GPU(s): {', '.join(d['id'] for d in devices)}")
+                else:
+                    log("No GPUs or render nodes found, running the standard benchmark.")
+
+            results = {}
+            with trace_span("benchmark", groups=["gpu"] if devices else plan["run"], devices=len(devices)):
+                if devices:
+                    # Parallel runs only cover the GPU side; CPU results are reused when still valid
+                    cpu_source = plan["reused"].get("cpu")
+                    record["reused"] = {"cpu": cpu_source} if cpu_source else {}
+                    record["executed"] = ["gpu"]
+                    device_results = run_parallel_benchmark(log_filename, devices)
+                    save_device_comparison(log_filename, device_results, compare_devices(device_results))
+                    mismatched = any(r["device_check"] == "mismatch" for r in device_results)
+                    record["valid"] = _last_returncode == 0 and not _last_stalls and not mismatched
+                    record["stalls"] = _last_stalls
+                    record["sources"] = dict(record["reused"], gpu=identifier)
+                elif plan["run"]:
+                    for group, source in plan["reused"].items():
+                        log(f"{group.upper()} fingerprint unchanged, reusing {group.upper()} results from {source}.")
+                    results = run_benchmark(log_filename, plan["args"])
+                    record["valid"] = _last_returncode == 0 and not _last_stalls
+                    record["stalls"] = _last_stalls
+                    record["sources"].update({group: identifier for group in plan["run"]})
+                else:
+                    log(f"Hardware and software unchanged, reusing results from {', '.join(sorted(set(plan['reused'].values())))}.")
+                    write_reused_log(log_filename, plan["reused"])
+                    record["valid"] = True
+            save_fingerprint(log_filename, record)
+            if record.get("stalls"):
+                log(f"{len(record['stalls'])} stall(s) recorded; later runs won't reuse these results.")
+
+            with trace_span("analysis"):
+                analyze_benchmark_results(results)
+                # Parallel runs already report weighted fps per device
+                log_library_weighted_results(None if devices else log_filename)
+    finally:
+        _run_active = False
+        _tracer.close()
+        _tracer = None
+        # Without a run log (e.g. the connection check failed) nothing would ever list or delete the trace
+        if not os.path.exists(os.path.join(results_dir, log_filename)):
+            try:
+                os.remove(get_trace_path(log_filename))
+            except OSError:
+                pass
 
 def main():
     url = os.environ.get('JELLYFIN_URL')